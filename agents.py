@@ -1,16 +1,50 @@
+from mesa import Agent
+
+####
+
+# --- Patient states, in the order of their integer codes ---
+STATE_NAMES = ["S", "Cp_s", "Cp_r", "Ip_s", "Ip_r", "R"]
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+
 ####
 
 class Patient(Agent):
-    def __init__(self, model, ward_id=None):
+    def __init__(self, model, ward_id=None, state=None):
         super().__init__(model)
-        self.ward_id = ward_id
-        self.assign_initial_state()
+        self._ward_id = ward_id
+        self._state = state  # given when restoring a snapshot, otherwise drawn from the lambda_* prevalences
+        self.progression_random = model.patient_random()  # own stream, shared across models run with the same seed
+        if state is None: self.assign_initial_state()
         self.newly_infected = False
         self.prev_state = self.state
         self.days_in_admission = 0
+        self.model.census.admit(self)
+
+    # State and ward changes are reported to the model's census so compartment counts stay current
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        if self._state is not None: self.model.census.change_state(self, state)
+        self._state = state
+
+    @property
+    def ward_id(self):
+        return self._ward_id
+
+    @ward_id.setter
+    def ward_id(self, ward_id):
+        self.model.census.change_ward(self, ward_id)
+        self._ward_id = ward_id
+
+    def remove(self):
+        self.model.census.discharge(self)
+        super().remove()
 
     def assign_initial_state(self):
-        r = random.random()
+        r = self.model.streams["initial"].random()
         params = self.model.params
         if r < params["lambda_cr"]:
             self.state = "Cp_r"
@@ -31,29 +65,29 @@ class Patient(Agent):
         if self.state == "R": return
 
         if self.state == "Cp_s":
-            if random.random() < params["kappa"] * params["m_s"]:
+            if self.progression_random.random() < params["kappa"] * params["m_s"]:
                 self.state = "Ip_s"
         elif self.state == "Cp_r":
-            if random.random() < params["kappa"] * params["m_s"] * (1 + params["delta_m"]):
+            if self.progression_random.random() < params["kappa"] * params["m_s"] * (1 + params["delta_m"]):
                 self.state = "Ip_r"
 
         if self.state == "Ip_s":
-            if random.random() < params["psi_s"] * params["iota"]:
+            if self.progression_random.random() < params["psi_s"] * params["iota"]:
                 self.state = "R"
         elif self.state == "Ip_r":
-            if random.random() < params["psi_r"] * params["iota"] * (1 - params["s_p"]):
+            if self.progression_random.random() < params["psi_r"] * params["iota"] * (1 - params["s_p"]):
                 self.state = "R"
 
-        if self.state == "Cp_s" and random.random() < params["mu_c"]:
+        if self.state == "Cp_s" and self.progression_random.random() < params["mu_c"]:
             self.state = "R"
-        elif self.state == "Cp_r" and random.random() < params["mu_c"]:
+        elif self.state == "Cp_r" and self.progression_random.random() < params["mu_c"]:
             self.state = "R"
-        elif self.state == "Ip_s" and random.random() < params["psi_s"] * (1 - params["iota"]):
+        elif self.state == "Ip_s" and self.progression_random.random() < params["psi_s"] * (1 - params["iota"]):
             self.state = "R"
-        elif self.state == "Ip_r" and random.random() < params["psi_r"] * (1 - (params["iota"] * (1 - params["s_p"]))):
+        elif self.state == "Ip_r" and self.progression_random.random() < params["psi_r"] * (1 - (params["iota"] * (1 - params["s_p"]))):
             self.state = "R"
 
-        if self.state == "Ip_s" and random.random() < params["prob_resistance_emergence"]:
+        if self.state == "Ip_s" and self.progression_random.random() < params["prob_resistance_emergence"]:
             self.state = "Ip_r"
 
 ####
@@ -71,7 +105,7 @@ class Nurse(Agent):
         params = self.model.params
         if self.state in ["Cn_s", "Cn_r"]:
             base_delta = (1 - params["theta"]) * params["low"] + params["theta"] * params["high"]
-            if random.random() < base_delta * self.compliance:
+            if self.random.random() < base_delta * self.compliance:
                 self.state = "U"
                 self.has_contacted = False
         self.interactions_this_step = 0
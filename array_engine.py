@@ -0,0 +1,341 @@
+import math
+import numpy as np
+from mesa import Model
+from mesa.datacollection import DataCollector
+from agents import Nurse, STATE_NAMES, STATE_CODES
+from transmission import TransmissionKernel
+from models import PARAMS, NoWardModel, WardModel, PatientAssignmentModel, AdmissionWardModel, AdmissionPatientAssignmentModel, resistance_can_reenter
+
+####
+
+# --- Integer state codes ---
+S, CP_S, CP_R, IP_S, IP_R, R = (STATE_CODES[name] for name in STATE_NAMES)
+
+# Order of the cumulative lambda thresholds used by Patient.assign_initial_state
+INITIAL_STATE_ORDER = np.array([CP_R, CP_S, IP_R, IP_S, S], dtype=np.int8)
+
+####
+
+class PatientArrays:
+    """Struct-of-arrays store for the patient population, one row per patient in the hospital."""
+    FIELDS = {
+        "state": np.int8,
+        "prev_state": np.int8,
+        "ward_id": np.int32,
+        "days_in_admission": np.int32,
+        "newly_infected": np.bool_,
+        "nurse": np.int32,  # index into model.nurses, -1 if unassigned
+    }
+
+    def __init__(self):
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+    def __len__(self):
+        return len(self.state)
+
+    def add(self, states, ward_ids):
+        """Appends new patients and returns their row indices."""
+        n = len(states)
+        new_rows = {
+            "state": states, "prev_state": states, "ward_id": ward_ids,
+            "days_in_admission": np.zeros(n), "newly_infected": np.zeros(n), "nurse": np.full(n, -1),
+        }
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.concatenate([getattr(self, name), np.asarray(new_rows[name], dtype=dtype)]))
+        return np.arange(len(self) - n, len(self))
+
+    def retire(self):
+        """Drops the rows of discharged patients and returns how many left from each state."""
+        keep = self.state != R
+        left_from = np.bincount(self.prev_state[~keep], minlength=R)[:R]
+        for name in self.FIELDS:
+            setattr(self, name, getattr(self, name)[keep])
+        return left_from
+
+####
+
+class ArrayNoWardModel(Model):
+    """NoWardModel with patients stored in PatientArrays and advanced by vectorized draws."""
+    def __init__(self, num_nurses=150, seed=None, **params):
+        super().__init__(seed=seed)
+        self.params = {**PARAMS, **params}
+        self.kernel = TransmissionKernel(self.params, self.rng)
+
+        ratio = self.params.get("target_patient_to_nurse_ratio")
+        if ratio and ratio > 0:
+            self.num_nurses = math.ceil(self.params["initial_patients"] / ratio)
+        else:
+            self.num_nurses = num_nurses
+
+        self.schedule = self.agents
+        self.running = True
+        self.discharged = {state: 0 for state in STATE_NAMES[:R]}
+
+        self.patients = PatientArrays()
+        self.patients.add(self.draw_initial_states(self.params["initial_patients"]), np.full(self.params["initial_patients"], -1))
+
+        self.nurses = []
+        for i in range(self.num_nurses):
+            n = Nurse(self)
+            self.schedule.add(n)
+            self.nurses.append(n)
+
+        self.datacollector = DataCollector(
+            model_reporters={
+                "Current_Patients": lambda m: m.count_patients(),
+                "Susceptible": lambda m: m.count_patients(S),
+                "Colonized_S": lambda m: m.count_patients(CP_S),
+                "Infected_S": lambda m: m.count_patients(IP_S),
+                "Colonized_R": lambda m: m.count_patients(CP_R),
+                "Infected_R": lambda m: m.count_patients(IP_R),
+                "New_Colonized_S": lambda m: m.count_patients(CP_S, new=True),
+                "New_Infected_S": lambda m: m.count_patients(IP_S, new=True),
+                "New_Colonized_R": lambda m: m.count_patients(CP_R, new=True),
+                "New_Infected_R": lambda m: m.count_patients(IP_R, new=True),
+                "Resistance_Emergence": lambda m: int(np.count_nonzero((m.patients.state == IP_R) & (m.patients.prev_state == IP_S))),
+                "Average_Nurse_Workload_Factor": lambda m: m.calculate_workload_factor(),
+            }
+        )
+
+    def count_patients(self, state=None, new=False):
+        """Counts patients still in hospital, optionally restricted to one state and to new infections."""
+        mask = self.patients.state != R if state is None else self.patients.state == state
+        if new: mask &= self.patients.newly_infected
+        return int(np.count_nonzero(mask))
+
+    def draw_initial_states(self, n):
+        params = self.params
+        thresholds = np.cumsum([params["lambda_cr"], params["lambda_cs"], params["lambda_ir"], params["lambda_is"]])
+        return INITIAL_STATE_ORDER[np.searchsorted(thresholds, self.rng.random(n), side="right")]
+
+    def add_new_patients(self, n):
+        """Admits n new patients and returns their row indices."""
+        return self.patients.add(self.draw_initial_states(n), np.full(n, -1))
+
+    def calculate_workload_factor(self):
+        return self.count_patients() / len(self.nurses) if self.nurses else 0.0
+
+    def resistance_absorbed(self):
+        """NoWardModel.resistance_absorbed on the patient arrays."""
+        if resistance_can_reenter(self.params) or np.isin(self.patients.state, (CP_R, IP_R)).any(): return False
+        return not any(n.state == "Cn_r" for n in self.nurses)
+
+    def advance_patients(self):
+        """Vectorized Patient.step: one Bernoulli draw per patient for each stage of the disease course."""
+        params = self.params
+        state = self.patients.state
+        self.patients.newly_infected[:] = False
+        u = self.rng.random((4, len(state)))
+
+        # Colonisation -> infection
+        p = np.zeros(len(STATE_NAMES))
+        p[CP_S] = params["kappa"] * params["m_s"]
+        p[CP_R] = params["kappa"] * params["m_s"] * (1 + params["delta_m"])
+        progressed = u[0] < p[state]
+        state[progressed] = np.where(state[progressed] == CP_S, IP_S, IP_R)
+
+        # Recovery under treatment
+        p = np.zeros(len(STATE_NAMES))
+        p[IP_S] = params["psi_s"] * params["iota"]
+        p[IP_R] = params["psi_r"] * params["iota"] * (1 - params["s_p"])
+        state[u[1] < p[state]] = R
+
+        # Decolonisation and discharge
+        p = np.zeros(len(STATE_NAMES))
+        p[CP_S] = p[CP_R] = params["mu_c"]
+        p[IP_S] = params["psi_s"] * (1 - params["iota"])
+        p[IP_R] = params["psi_r"] * (1 - (params["iota"] * (1 - params["s_p"])))
+        state[u[2] < p[state]] = R
+
+        # Resistance emergence
+        state[(state == IP_S) & (u[3] < params["prob_resistance_emergence"])] = IP_R
+
+    def sample_contacts(self, nurses, rows):
+        """Draws min(nurse_max_interactions, len(rows)) distinct patients for each nurse, in random order."""
+        return rows[self.kernel.sample_contacts(len(nurses), len(rows), self.params["nurse_max_interactions"])]
+
+    def transmit(self, nurses, contacts):
+        """Resolves nurse contamination and patient colonisation over each nurse's contact rows in turn."""
+        self.patients.newly_infected[self.kernel.resolve(nurses, self.patients.state, contacts)] = True
+
+    def handle_granular_interactions(self):
+        rows = np.flatnonzero(self.patients.state != R)
+        if not len(rows) or not self.nurses: return
+
+        workload_factor = self.calculate_workload_factor()
+        for nurse in self.nurses: nurse.update_compliance(workload_factor)
+        self.transmit(self.nurses, self.sample_contacts(self.nurses, rows))
+
+    def step(self):
+        pop = self.patients
+        pop.prev_state[:] = pop.state
+        self.advance_patients()
+        self.schedule.shuffle_do("step")
+        removed_this_step = int(np.count_nonzero((pop.state == R) & (pop.prev_state != R)))
+        current_patients = self.count_patients()
+        num_to_admit = min(self.params["admission_rate_per_step"], self.params["max_patient_capacity"] - current_patients) if current_patients < self.params["max_patient_capacity"] else removed_this_step
+        self.add_new_patients(num_to_admit)
+        self.handle_granular_interactions()
+        self.datacollector.collect(self)
+        for code, count in enumerate(pop.retire()): self.discharged[STATE_NAMES[code]] += int(count)
+
+####
+
+class ArrayWardModel(ArrayNoWardModel):
+    def __init__(self, num_nurses=150, num_wards=10, **params):
+        self.num_wards = num_wards
+        super().__init__(num_nurses=num_nurses, **params)
+        self.patients.ward_id[:] = np.arange(len(self.patients)) % self.num_wards
+        nurses_per_ward = self.num_nurses // self.num_wards
+        for i, n in enumerate(self.nurses): n.ward_id = i // nurses_per_ward if nurses_per_ward > 0 else i % self.num_wards
+        self.nurses_by_ward = {ward_id: [i for i, n in enumerate(self.nurses) if n.ward_id == ward_id] for ward_id in range(self.num_wards)}
+        self.high_risk_wards = ()
+
+    def add_new_patients(self, n):
+        return self.patients.add(self.draw_initial_states(n), self.rng.integers(self.num_wards, size=n))
+
+    def ward_workload_factors(self):
+        pop = self.patients
+        patients_in_ward = np.bincount(pop.ward_id[pop.state != R], minlength=self.num_wards)[:self.num_wards]
+        nurses_in_ward = np.array([len(self.nurses_by_ward[w]) for w in range(self.num_wards)])
+        return np.divide(patients_in_ward, nurses_in_ward, out=np.zeros(self.num_wards), where=nurses_in_ward > 0)
+
+    def _calculate_ward_workload_factor(self, ward_id):
+        return self.ward_workload_factors()[ward_id]
+
+    def calculate_workload_factor(self):
+        return float(np.mean(self.ward_workload_factors())) if self.num_wards else 0.0
+
+    def update_ward_compliance(self, ward_id, nurses, workload_factor):
+        for nurse in nurses:
+            nurse.update_compliance(workload_factor)
+            if ward_id in self.high_risk_wards:
+                nurse.compliance += (1 - nurse.compliance) * self.params["compliance_boost"]
+
+    def handle_granular_interactions(self):
+        pop = self.patients
+        active = np.flatnonzero(pop.state != R)
+        workload_factors = self.ward_workload_factors()
+        for ward_id in range(self.num_wards):
+            rows = active[pop.ward_id[active] == ward_id]
+            nurses = [self.nurses[i] for i in self.nurses_by_ward[ward_id]]
+            if not len(rows) or not nurses: continue
+            self.update_ward_compliance(ward_id, nurses, workload_factors[ward_id])
+            self.transmit(nurses, self.sample_contacts(nurses, rows))
+
+####
+
+class ArrayPatientAssignmentModel(ArrayWardModel):
+    def __init__(self, num_nurses=150, num_wards=10, **params):
+        super().__init__(num_nurses=num_nurses, num_wards=num_wards, **params)
+        self._assign_initial_patients()
+
+    def _assign_initial_patients(self):
+        pop = self.patients
+        for ward_id in range(self.num_wards):
+            nurses_in_ward = self.nurses_by_ward[ward_id]
+            if not nurses_in_ward: continue
+            rows = np.flatnonzero(pop.ward_id == ward_id)
+            pop.nurse[rows] = np.array(nurses_in_ward)[np.arange(len(rows)) % len(nurses_in_ward)]
+
+    def assign_least_burdened(self, row):
+        """Assigns the patient in row to the nurse of its ward with the fewest assigned patients."""
+        nurses_in_ward = self.nurses_by_ward.get(int(self.patients.ward_id[row]), [])
+        if not nurses_in_ward: return
+        assigned = self.patients.nurse
+        loads = np.bincount(assigned[assigned >= 0], minlength=len(self.nurses))[nurses_in_ward]
+        assigned[row] = nurses_in_ward[int(np.argmin(loads))]
+
+    def add_new_patients(self, n):
+        rows = super().add_new_patients(n)
+        for row in rows: self.assign_least_burdened(row)
+        return rows
+
+    def assigned_contacts(self):
+        """Active patients grouped by assigned nurse, as one row array per nurse."""
+        pop = self.patients
+        active = np.flatnonzero((pop.state != R) & (pop.nurse >= 0))
+        by_nurse = active[np.argsort(pop.nurse[active], kind="stable")]
+        bounds = np.searchsorted(pop.nurse[by_nurse], np.arange(len(self.nurses) + 1))
+        return [by_nurse[bounds[i]:bounds[i + 1]] for i in range(len(self.nurses))]
+
+    def handle_granular_interactions(self):
+        contacts = self.assigned_contacts()
+        workload_factors = self.ward_workload_factors()
+        for ward_id in range(self.num_wards):
+            nurse_ids = self.nurses_by_ward[ward_id]
+            if not nurse_ids: continue
+            nurses = [self.nurses[i] for i in nurse_ids]
+            self.update_ward_compliance(ward_id, nurses, workload_factors[ward_id])
+            self.transmit(nurses, [contacts[i] for i in nurse_ids])
+
+####
+
+class ArrayAdmissionWardModel(ArrayWardModel):
+    def __init__(self, num_nurses=150, num_wards=10, **params):
+        super().__init__(num_nurses=num_nurses, num_wards=num_wards, **params)
+        self.general_wards = [i for i in range(num_wards) if i not in [self.params["admission_ward_id"], self.params["resistant_cohort_ward_id"]]]
+        self.high_risk_wards = (self.params["admission_ward_id"], self.params["resistant_cohort_ward_id"])
+
+    def add_new_patients(self, n):
+        return self.patients.add(self.draw_initial_states(n), np.full(n, self.params["admission_ward_id"]))
+
+    def triage_patients(self, rows):
+        pop = self.patients
+        resistant = np.isin(pop.state[rows], (CP_R, IP_R))
+        if self.general_wards:
+            general = self.rng.choice(self.general_wards, size=len(rows))
+        else:
+            general = np.full(len(rows), self.params["resistant_cohort_ward_id"])
+        pop.ward_id[rows] = np.where(resistant, self.params["resistant_cohort_ward_id"], general)
+
+    def step(self):
+        pop = self.patients
+        in_admission = pop.ward_id == self.params["admission_ward_id"]
+        self.triage_patients(np.flatnonzero(in_admission & (pop.days_in_admission >= self.params["admission_period"])))
+        super().step()
+        pop = self.patients
+        pop.days_in_admission[pop.ward_id == self.params["admission_ward_id"]] += 1
+
+####
+
+class ArrayAdmissionPatientAssignmentModel(ArrayPatientAssignmentModel):
+    def __init__(self, num_nurses=150, num_wards=10, **params):
+        super().__init__(num_nurses=num_nurses, num_wards=num_wards, **params)
+        self.general_wards = [i for i in range(num_wards) if i not in [self.params["admission_ward_id"], self.params["resistant_cohort_ward_id"]]]
+        self.high_risk_wards = (self.params["admission_ward_id"], self.params["resistant_cohort_ward_id"])
+
+    def add_new_patients(self, n):
+        rows = self.patients.add(self.draw_initial_states(n), np.full(n, self.params["admission_ward_id"]))
+        for row in rows: self.assign_least_burdened(row)
+        return rows
+
+    def triage_patients(self, rows):
+        pop = self.patients
+        for row in rows:
+            pop.nurse[row] = -1
+            if pop.state[row] in (CP_R, IP_R) or not self.general_wards:
+                pop.ward_id[row] = self.params["resistant_cohort_ward_id"]
+            else:
+                pop.ward_id[row] = self.general_wards[self.rng.integers(len(self.general_wards))]
+            self.assign_least_burdened(row)
+
+    def step(self):
+        pop = self.patients
+        in_admission = pop.ward_id == self.params["admission_ward_id"]
+        self.triage_patients(np.flatnonzero(in_admission & (pop.days_in_admission >= self.params["admission_period"])))
+        super().step()
+        pop = self.patients
+        pop.days_in_admission[pop.ward_id == self.params["admission_ward_id"]] += 1
+
+####
+
+# --- Engine selection ---
+ARRAY_MODELS = {
+    NoWardModel: ArrayNoWardModel,
+    WardModel: ArrayWardModel,
+    PatientAssignmentModel: ArrayPatientAssignmentModel,
+    AdmissionWardModel: ArrayAdmissionWardModel,
+    AdmissionPatientAssignmentModel: ArrayAdmissionPatientAssignmentModel,
+}
@@ -1,104 +1,172 @@
 import math
+import os
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import random
-import statsmodels.api as sm
-from mesa import Agent, Model
-from mesa.datacollection import DataCollector
-from models import NoWardModel, WardModel, PatientAssignmentModel, AdmissionWardModel, AdmissionPatientAssignmentModel
-from agents import Patients, Nurses 
+from models import NoWardModel, WardModel, PatientAssignmentModel, AdmissionWardModel, AdmissionPatientAssignmentModel, StepProfiler
+from parallel import iter_batch, engine_class
+from results import ResultStore, ConvergenceMonitor, StepAggregator
+from cache import ResultCache
 
 ####
 
-# --- Model Parameters ---
-PARAMS = {
-    "a": 5.0, "x": 0.2, "n": 0.3, "s_b": 0.25, "s_p": 0.1,
-    "theta": 0.8, "low": 0.1, "high": 0.5,
-    "psi_s": 0.0833, "psi_r": 0.0454, "iota": 0.8,
-    "kappa": 0.1428, "m_s": 0.3, "delta_m": 0.25,
-    "mu_c": 0.015, "b_np": 0.09, "b_pn": 0.3,
-    "lambda_cs": 0.02, "lambda_cr": 0.02,
-    "lambda_is": 0.01, "lambda_ir": 0.01,
-    # Granular model parameters
-    "nurse_max_interactions": 7,
-    "compliance_decrease_rate": 0.05,
-    "prob_resistance_emergence": 0.001,
-    "initial_patients": 275,
-    "max_patient_capacity": 400,
-    "admission_rate_per_step": 10,
-    # Admission/Cohort model parameters
-    "admission_ward_id": 0,
-    "resistant_cohort_ward_id": 1,
-    "admission_period": 3,
-    "compliance_boost": 0.25,
-    # Nurse ratio control
-    "target_patient_to_nurse_ratio": 10 # Set > 0 to control ratio (e.g., 4 for 1:4). If 0, uses fixed num_nurses.
-}
+# --- Batch run ---
+
+def run_simulation(model_class, max_iterations, max_steps, output_path, model_title, engine="agent", master_seed=None, workers=None, snapshot=None, cache=None, precision=None, profile=False, track=None, params=None):
+    """
+    Runs a batch simulation for a given model class, streams each finished iteration into the
+    ResultStore at output_path and into a results.StepAggregator, saved with the store, and returns
+    the per-step means.
+    Set engine="array" to run the NumPy-backed counterpart of model_class from array_engine.py,
+    or engine="count" for the compartment-count engine of count_engine.py (NoWardModel only).
+    Iterations are spread over `workers` processes (default: all cores); each one is seeded from
+    master_seed, so the same master_seed reproduces the same results whatever the number of workers.
+    Iterations already in the store are skipped, so an interrupted batch resumes where it stopped.
+    Passing a snapshot.Snapshot forks every iteration from that burn-in state and runs max_steps more steps.
+    With a cache.ResultCache, iterations computed before (same model, params, seed and code) are read back.
+    With a precision target (see results.ConvergenceMonitor, e.g. {"target": 0.05, "min_iterations": 15}),
+    max_iterations becomes an upper bound: iterations are added in order until the confidence intervals of the
+    tracked outputs are narrow enough. The iterations kept are always 0..k-1, whatever the number of workers.
+    With profile=True every iteration records models.StepProfiler metrics (bypassing the cache), and their
+    per-phase means are printed and saved to profile.csv in output_path.
+    track, a list of columns (e.g. ["New_Colonized_R", "New_Infected_R"]), stores only those; when they are all
+    resistant columns, iterations whose resistant strain dies out for good stop there and are filled with zeros.
+    params overrides PARAMS (and constructor arguments such as num_wards) for this batch only; unlike edits to
+    models.PARAMS, the overrides reach worker processes whatever their start method.
+    """
+    model_class = engine_class(model_class, engine)
+    if snapshot is not None and engine != "agent":
+        raise ValueError("Snapshots can only be forked into the agent engine")
+    if profile and engine != "agent":
+        raise ValueError("Profiling is only available on the agent engine")
+
+    store = ResultStore(output_path)
+    if master_seed is None:
+        master_seed = (store.manifest["settings"] or {}).get("master_seed") or np.random.SeedSequence().entropy
+    store.open(model=model_class.__name__, max_steps=max_steps, master_seed=master_seed, start_step=snapshot.steps if snapshot is not None else 0,
+               **({"track": list(track)} if track is not None else {}), **({"params": params} if params else {}))
+
+    completed = set(store.completed())
+    missing = [it for it in range(max_iterations) if it not in completed]
+    if len(missing) < max_iterations:
+        print(f"Resuming batch run for {model_title}: {max_iterations - len(missing)}/{max_iterations} iterations already in {output_path}")
+    print(f"Starting batch run for {model_title} (master seed {master_seed})...")
+
+    monitor = ConvergenceMonitor(precision) if precision is not None else None
+    if monitor is not None:
+        for _, arrays in store.iter_chunks(): monitor.update(pd.DataFrame(arrays))
+    stop = monitor.converged if monitor is not None else None
+
+    # Write each iteration to disk as soon as it finishes (with a precision target, in iteration order), and feed
+    # the aggregator in iteration order from the store, so its statistics do not depend on the number of workers
+    aggregator = StepAggregator()
+    finished, order = {}, iter(range(max_iterations))
+    next_it = next(order, None)
+
+    def drain():
+        nonlocal next_it
+        while next_it in completed or (next_it in finished and not (monitor is not None and monitor.converged())):
+            if next_it in completed:
+                model_data = store.read(next_it)
+            else:
+                model_data = finished.pop(next_it)
+                store.append(next_it, model_data)
+                monitor.update(model_data)
+            aggregator.update(model_data, iteration=next_it)
+            next_it = next(order, None)
+
+    drain()
+    profiles = []
+    model_kwargs = {**(params or {}), **({"profile": True} if profile else {})}
+    for done, (it, model_data) in enumerate(iter_batch(model_class, max_iterations, max_steps, master_seed=master_seed, workers=workers, iterations=missing, snapshot=snapshot, cache=cache, stop=stop, track=track, **model_kwargs), 1):
+        if done % 10 == 0:
+            print(f"  ...completed {done}/{len(missing)} iterations for {model_title}.")
+        if "profile" in model_data.attrs: profiles.append(model_data.attrs["profile"])
+        if monitor is None:
+            store.append(it, model_data)
+            completed.add(it)
+        else:
+            finished[it] = model_data
+        drain()
+    if monitor is not None:
+        widths = ", ".join(f"{name} {width:.3g}" for name, width in monitor.half_widths().items())
+        print(f"{'Converged' if monitor.converged() else 'Did not converge'} after {monitor.n} iterations for {model_title} (half-widths: {widths})")
+    print(f"Saved raw data for {model_title} to {output_path}")
+    if profiles:
+        summary = StepProfiler.summary(profiles)
+        summary.to_csv(os.path.join(output_path, "profile.csv"))
+        print(f"Step profile for {model_title} (means per step over {len(profiles)} iterations):")
+        print(summary.round(3))
+
+    # Save the per-step aggregate next to the raw data and return its means
+    if aggregator.n: aggregator.save(os.path.join(output_path, StepAggregator.FILE))
+    return aggregator.mean()
 
 ####
 
-# --- Batch run ---
+# --- Paired comparison ---
 
-def run_simulation(model_class, max_iterations, max_steps, output_csv_path, model_title):
+def paired_differences(runs, reference, columns=("New_Colonized_R", "New_Infected_R"), confidence=0.95):
     """
-    Runs a batch simulation for a given model class, saves the raw data to CSV,
-    and returns the aggregated mean results.
+    Compares every model with the reference model iteration by iteration, using the run total of `columns`
+    (by default the cumulative number of resistant cases). `runs` maps model titles to raw DataFrames
+    as returned by ResultStore.load. The models must have been run with the same master_seed, so that iteration i
+    of each model shares its admission, initial-state and disease-course random streams.
     """
-    print(f"Starting batch run for {model_title}...")
-    
-    # Create a list to hold each iteration's DataFrame
-    all_run_data = []
-
-    for it in range(max_iterations):
-        # Initialize the model
-        model = model_class()
-        
-        # Run the model for max_steps
-        for _ in range(max_steps):
-            model.step()
-            
-        # Get the model data for this run
-        model_data = model.datacollector.get_model_vars_dataframe()
-        model_data['iteration'] = it
-        model_data['Step'] = range(1, max_steps + 1)
-        all_run_data.append(model_data)
-        
-        if (it + 1) % 10 == 0:
-            print(f"  ...completed {it + 1}/{max_iterations} iterations for {model_title}.")
-
-    # Concatenate all run data into a single DataFrame
-    full_df = pd.concat(all_run_data, ignore_index=True)
-    
-    # Save the raw data to CSV
-    full_df.to_csv(output_csv_path, index=False)
-    print(f"Saved raw data for {model_title} to {output_csv_path}")
+    from scipy import stats  # only needed here, so batch runs and their workers do not load SciPy
+    totals = {title: df.groupby("iteration")[list(columns)].sum().sum(axis=1) for title, df in runs.items()}
+    rows = []
+    for title, total in totals.items():
+        if title == reference: continue
+        diff = (total - totals[reference]).dropna()  # adaptive batches may differ in length; pair the common iterations
+        n = len(diff)
+        half_width = stats.t.ppf((1 + confidence) / 2, n - 1) * diff.std(ddof=1) / math.sqrt(n) if n > 1 else np.nan
+        rows.append({
+            "Model": title,
+            "Mean_Difference": diff.mean(),
+            "CI_Low": diff.mean() - half_width,
+            "CI_High": diff.mean() + half_width,
+            # How many unpaired iterations it would take to match the precision of one paired iteration
+            "Variance_Reduction": (total.var(ddof=1) + totals[reference].var(ddof=1)) / diff.var(ddof=1) if n > 1 and diff.var(ddof=1) > 0 else np.nan,
+        })
+    return pd.DataFrame(rows).set_index("Model")
 
-    # Calculate and return the mean DataFrame
-    df_mean = full_df.groupby("Step").mean(numeric_only=True)
-    return df_mean
+# --- Models and result stores ---
+MODELS_TO_RUN = [
+    {"class": NoWardModel, "title": "No Ward Model", "store": "no_ward_data"},
+    {"class": WardModel, "title": "Ward Model", "store": "ward_data"},
+    {"class": PatientAssignmentModel, "title": "Patient Assignment Model", "store": "patient_assignment_data"},
+    {"class": AdmissionWardModel, "title": "Admission Ward Model", "store": "admission_ward_data"},
+    {"class": AdmissionPatientAssignmentModel, "title": "Admission Patient Assignment Model", "store": "admission_assignment_data"}
+]
 
 # --- Main execution ---
 if __name__ == "__main__":
     MAX_ITERATIONS = 50
     MAX_STEPS = 365
-
-    models_to_run = [
-        {"class": NoWardModel, "title": "No Ward Model", "csv": "no_ward_data.csv"},
-        {"class": WardModel, "title": "Ward Model", "csv": "ward_data.csv"},
-        {"class": PatientAssignmentModel, "title": "Patient Assignment Model", "csv": "patient_assignment_data.csv"},
-        {"class": AdmissionWardModel, "title": "Admission Ward Model", "csv": "admission_ward_data.csv"},
-        {"class": AdmissionPatientAssignmentModel, "title": "Admission Patient Assignment Model", "csv": "admission_assignment_data.csv"}
-    ]
+    MASTER_SEED = 2025
+    WORKERS = None  # None uses every core
+    CACHE = ResultCache("sim_cache")  # reruns with unchanged code and params are read back from here
+    PROFILE = False  # True to time each phase of the step and print a per-model profile summary
+    PRECISION = None  # e.g. {"target": 0.05, "min_iterations": 15} to stop each model once its cumulative resistant cases are known to +-5%
 
     all_means = {}
-    for model_info in models_to_run:
+    for model_info in MODELS_TO_RUN:
         mean_df = run_simulation(
             model_class=model_info["class"],
             max_iterations=MAX_ITERATIONS,
             max_steps=MAX_STEPS,
-            output_csv_path=model_info["csv"],
-            model_title=model_info["title"]
+            output_path=model_info["store"],
+            model_title=model_info["title"],
+            master_seed=MASTER_SEED,
+            workers=WORKERS,
+            cache=CACHE,
+            precision=PRECISION,
+            profile=PROFILE
         )
         all_means[model_info["title"]] = mean_df
+
+    # Every model used MASTER_SEED, so iteration i is paired across models (common random numbers)
+    paired = paired_differences({m["title"]: ResultStore(m["store"]).load(["New_Colonized_R", "New_Infected_R"]) for m in MODELS_TO_RUN}, reference="No Ward Model")
+    print("Paired differences in cumulative resistant cases versus the No Ward Model:")
+    print(paired)
     
@@ -0,0 +1,148 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import mesa
+import numpy as np
+from models import PARAMS, NoWardModel, WardModel, PatientAssignmentModel, AdmissionWardModel, AdmissionPatientAssignmentModel
+from parallel import engine_class
+
+####
+
+# --- Benchmark matrix ---
+MODEL_CLASSES = [NoWardModel, WardModel, PatientAssignmentModel, AdmissionWardModel, AdmissionPatientAssignmentModel]
+HOSPITAL_SIZES = [(100, 150), (275, 400), (1000, 1500)]  # (initial_patients, max_patient_capacity)
+WARD_COUNTS = [5, 10, 20]
+NURSE_RATIOS = [4, 6, 10]  # target_patient_to_nurse_ratio: nurse count and contacts per step grow as it falls
+QUICK_SIZES, QUICK_WARDS, QUICK_RATIOS = [(275, 400)], [10], [10]
+SEED = 12345
+
+def cases(sizes, ward_counts, ratios, engine="agent"):
+    """One benchmark case per model class, hospital size, patient-to-nurse ratio and (for ward models) number of wards."""
+    for model_class in MODEL_CLASSES:
+        try: run_class = engine_class(model_class, engine)
+        except ValueError: continue
+        for initial_patients, capacity in sizes:
+            for ratio in ratios:
+                for num_wards in (ward_counts if issubclass(model_class, WardModel) else [None]):
+                    kwargs = {"initial_patients": initial_patients, "max_patient_capacity": capacity, "target_patient_to_nurse_ratio": ratio}
+                    if num_wards is not None: kwargs["num_wards"] = num_wards
+                    yield {"model": model_class.__name__, "engine": engine, "run_class": run_class, "kwargs": kwargs}
+
+####
+
+# --- Measurement ---
+
+def run_case(case, steps, warmup, memory=True):
+    """Times `steps` steps after `warmup` untimed ones; peak memory is measured in a separate traced run."""
+    model = case["run_class"](seed=SEED, **case["kwargs"])
+    for _ in range(warmup): model.step()
+    latencies = np.empty(steps)
+    for i in range(steps):
+        start = time.perf_counter()
+        model.step()
+        latencies[i] = time.perf_counter() - start
+
+    result = {
+        "model": case["model"], "engine": case["engine"],
+        "initial_patients": case["kwargs"]["initial_patients"], "max_patient_capacity": case["kwargs"]["max_patient_capacity"],
+        "nurse_ratio": case["kwargs"]["target_patient_to_nurse_ratio"], "num_wards": case["kwargs"].get("num_wards"),
+        "steps": steps,
+        "steps_per_sec": steps / latencies.sum(),
+        "latency_ms": {f"p{q}": float(np.percentile(latencies, q) * 1000) for q in (50, 90, 99)},
+    }
+    if memory:
+        # tracemalloc slows Python down, so memory gets its own run from construction to the last step
+        tracemalloc.start()
+        model = case["run_class"](seed=SEED, **case["kwargs"])
+        for _ in range(warmup + steps): model.step()
+        result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+    return result
+
+def environment():
+    try: commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "mesa": mesa.__version__,
+        "numpy": np.__version__,
+        "machine": platform.platform(),
+    }
+
+def run_benchmarks(sizes=HOSPITAL_SIZES, ward_counts=WARD_COUNTS, ratios=NURSE_RATIOS, engine="agent", steps=100, warmup=20, memory=True, progress=print):
+    results = []
+    for case in cases(sizes, ward_counts, ratios, engine):
+        result = run_case(case, steps, warmup, memory)
+        results.append(result)
+        if progress: progress(format_result(result))
+    return {"environment": environment(), "results": results}
+
+####
+
+# --- Reporting and baselines ---
+
+def case_key(result):
+    # reports from before the ratio axis ran every case at the default ratio
+    ratio = result.get("nurse_ratio", PARAMS["target_patient_to_nurse_ratio"])
+    return (result["model"], result["engine"], result["initial_patients"], result["max_patient_capacity"], f"1:{ratio}", result["num_wards"])
+
+def format_result(result):
+    wards = f"{result['num_wards']} wards" if result["num_wards"] is not None else "no wards"
+    memory = f", peak {result['peak_memory_mb']:.1f} MB" if "peak_memory_mb" in result else ""
+    latency = result["latency_ms"]
+    return (f"{result['model']:<32} {result['engine']:<5} {result['initial_patients']:>5}/{result['max_patient_capacity']:<5} "
+            f"1:{result.get('nurse_ratio', PARAMS['target_patient_to_nurse_ratio']):<3} {wards:<9} "
+            f"{result['steps_per_sec']:8.1f} steps/s  p50 {latency['p50']:.2f} ms  p99 {latency['p99']:.2f} ms{memory}")
+
+def compare(current, baseline, threshold=0.10):
+    """
+    Compares throughput case by case with a baseline report; returns a list of rows with the speed ratio
+    (current / baseline steps per second) and whether the case is a regression (ratio below 1 - threshold).
+    """
+    previous = {case_key(r): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get(case_key(result))
+        if before is None: continue
+        ratio = result["steps_per_sec"] / before["steps_per_sec"]
+        rows.append({"case": case_key(result), "baseline": before["steps_per_sec"], "current": result["steps_per_sec"], "ratio": ratio, "regression": ratio < 1 - threshold})
+    return rows
+
+####
+
+# --- Command line ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark step throughput of the five models across hospital sizes and staffing ratios.")
+    parser.add_argument("--output", default="benchmark.json", help="where to save the JSON report")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown counted as a regression (default 0.10)")
+    parser.add_argument("--engine", default="agent", choices=["agent", "array", "count"])
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--quick", action="store_true", help="default hospital size, ratio 1:10 and 10 wards only")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        sizes=QUICK_SIZES if args.quick else HOSPITAL_SIZES,
+        ward_counts=QUICK_WARDS if args.quick else WARD_COUNTS,
+        ratios=QUICK_RATIOS if args.quick else NURSE_RATIOS,
+        engine=args.engine, steps=args.steps, warmup=args.warmup, memory=not args.no_memory,
+    )
+    with open(args.output, "w") as f: json.dump(report, f, indent=1)
+    print(f"Saved benchmark report to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        for row in rows:
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{' '.join(str(part) for part in row['case'] if part is not None):<60} {row['baseline']:8.1f} -> {row['current']:8.1f} steps/s ({row['ratio']:.2f}x){flag}")
+        sys.exit(1 if any(row["regression"] for row in rows) else 0)
@@ -0,0 +1,180 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import mesa
+import numpy as np
+import pandas as pd
+from models import PARAMS
+
+####
+
+# --- Cache keys ---
+CORE_FILES = ["agents.py", "models.py", "transmission.py"]  # code every engine's results depend on
+NON_RESULT_KWARGS = {"check_counters", "record_states", "profile"}  # constructor flags that do not change the time series
+_code_versions = {}
+
+def code_version(model_class):
+    """Hash of the source files that determine model_class's results, plus the Mesa and NumPy versions."""
+    module_file = inspect.getsourcefile(model_class)
+    if module_file not in _code_versions:
+        digest = hashlib.sha256(f"mesa {mesa.__version__} numpy {np.__version__}".encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted({os.path.join(here, name) for name in CORE_FILES} | {os.path.abspath(module_file)}):
+            with open(path, "rb") as f: digest.update(f.read())
+        _code_versions[module_file] = digest.hexdigest()[:16]
+    return _code_versions[module_file]
+
+####
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of per-step model time series. Entries are keyed by a hash of the model class,
+    the merged params and constructor arguments, the number of steps, the seed and the code version, so any change
+    to these computes a new entry. Each entry is one .npz (columns plus a JSON header); once the cache grows past
+    max_bytes, the least recently used entries are evicted down to low_water * max_bytes.
+    The cache's total size is kept in usage.json and updated on every put, so only eviction scans the directory.
+    Concurrent writers may lose each other's updates; the total is an estimate that every scan sets right.
+    """
+    USAGE = "usage.json"
+
+    def __init__(self, path="sim_cache", max_bytes=2 * 1024 ** 3, low_water=0.8):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+
+    def key(self, model_class, seed, max_steps, model_kwargs):
+        """Key of a run, or None if the run cannot be cached (no seed)."""
+        if seed is None: return None
+        return hashlib.sha256(json.dumps(self.describe(model_class, seed, max_steps, model_kwargs), sort_keys=True, default=str).encode()).hexdigest()
+
+    def describe(self, model_class, seed, max_steps, model_kwargs):
+        kwargs = {k: v for k, v in model_kwargs.items() if k not in NON_RESULT_KWARGS}
+        return {
+            "model": f"{model_class.__module__}.{model_class.__qualname__}",
+            "params": {**PARAMS, **kwargs},
+            "max_steps": max_steps,
+            "seed": seed,
+            "code_version": code_version(model_class),
+        }
+
+    def get(self, key):
+        """The cached DataFrame for key, or None; a hit marks the entry as recently used."""
+        if key is None: return None
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as entry:
+                df = pd.DataFrame({name: entry[name] for name in json.loads(str(entry["meta"]))["columns"]})
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        try: os.utime(path)
+        except FileNotFoundError: pass  # evicted by another worker since the load; the data is still good
+        return df
+
+    def put(self, key, df, description=None):
+        if key is None: return
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {**(description or {}), "columns": list(df.columns)}
+        try: replaced = os.path.getsize(path)
+        except OSError: replaced = 0
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, meta=np.array(json.dumps(meta, default=str)), **{name: df[name].to_numpy() for name in df.columns})
+        os.replace(path + ".tmp", path)
+
+        usage = self._read_usage()
+        if usage is None:
+            self.evict()  # no running total yet: one scan establishes it
+            return
+        usage += os.path.getsize(path) - replaced
+        self._write_usage(usage)
+        if usage > self.max_bytes: self.evict()
+
+    def entries(self):
+        """(path, size, last use) of every entry."""
+        found = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(".npz"): continue
+                path = os.path.join(root, name)
+                try: stat = os.stat(path)
+                except FileNotFoundError: continue
+                found.append((path, stat.st_size, stat.st_mtime))
+        return found
+
+    def evict(self):
+        """
+        Scans the cache and, if it is larger than max_bytes, deletes least recently used entries until it fits in
+        low_water * max_bytes, so the next scan is many puts away. Records the resulting total in usage.json.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for path, size, _ in sorted(entries, key=lambda e: e[2]):
+                if total <= self.low_water * self.max_bytes: break
+                try: os.remove(path)
+                except FileNotFoundError: pass
+                total -= size
+        self._write_usage(total)
+
+    def invalidate(self, model=None, stale=False):
+        """
+        Deletes entries and returns how many: all of them, those of one model class (by name), and/or with
+        stale=True only those written by an older version of the code.
+        """
+        removed = 0
+        current = {}
+        for path, _, _ in self.entries():
+            if model is not None or stale:
+                try:
+                    with np.load(path) as entry: meta = json.loads(str(entry["meta"]))
+                except (KeyError, ValueError, OSError):
+                    meta = {}
+                name = meta.get("model", "")
+                if model is not None and name.rsplit(".", 1)[-1] != model: continue
+                if stale:
+                    if name not in current: current[name] = self._current_version(name)
+                    if meta.get("code_version") == current[name]: continue
+            os.remove(path)
+            removed += 1
+        if removed: self._write_usage(sum(size for _, size, _ in self.entries()))
+        return removed
+
+    # --- Internals ---
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + ".npz")
+
+    def _read_usage(self):
+        try:
+            with open(os.path.join(self.path, self.USAGE)) as f: return int(json.load(f)["bytes"])
+        except (FileNotFoundError, KeyError, ValueError, TypeError):
+            return None
+
+    def _write_usage(self, total):
+        path = os.path.join(self.path, self.USAGE)
+        os.makedirs(self.path, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"  # one temporary file per process, as workers write concurrently
+        with open(tmp, "w") as f: json.dump({"bytes": int(total)}, f)
+        os.replace(tmp, path)
+
+    def _current_version(self, qualified_name):
+        module_name, _, class_name = qualified_name.rpartition(".")
+        try:
+            module = __import__(module_name)
+            return code_version(getattr(module, class_name))
+        except (ImportError, AttributeError, ValueError):
+            return None
+
+####
+
+# --- Invalidation command ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Invalidate cached simulation results.")
+    parser.add_argument("--path", default="sim_cache", help="cache directory")
+    parser.add_argument("--model", help="only entries of this model class, e.g. WardModel")
+    parser.add_argument("--stale", action="store_true", help="only entries computed by an older version of the code")
+    args = parser.parse_args()
+    removed = ResultCache(args.path).invalidate(model=args.model, stale=args.stale)
+    print(f"Removed {removed} cached results from {args.path}")
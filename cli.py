@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+####
+
+# --- Configuration ---
+# A run is described by a JSON (or TOML) file; every key is optional:
+#   "models":     class names from batch_run.MODELS_TO_RUN (default: all five); the first is the reference in reports
+#   "iterations", "steps", "master_seed", "workers", "engine" ("agent", "array" or "count")
+#   "params":     PARAMS overrides and constructor arguments such as num_wards, applied to every model
+#   "output":     directory holding one result store per model, the config and the report
+#   "cache":      result cache directory, or null to disable caching
+#   "precision", "track", "profile": as in batch_run.run_simulation
+# Only the models and result modules are imported to run a batch; plotting and statistics load in `report`.
+
+DEFAULTS = {
+    "models": None,
+    "iterations": 50,
+    "steps": 365,
+    "master_seed": 2025,
+    "workers": None,
+    "engine": "agent",
+    "params": {},
+    "output": "results",
+    "cache": "sim_cache",
+    "precision": None,
+    "track": None,
+    "profile": False,
+}
+
+def load_config(path):
+    """Reads a run config, filling in DEFAULTS; unknown keys raise ValueError."""
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as f: config = tomllib.load(f)
+    else:
+        with open(path) as f: config = json.load(f)
+    unknown = set(config) - set(DEFAULTS)
+    if unknown: raise ValueError(f"Unknown config keys in {path}: {sorted(unknown)}")
+    return {**DEFAULTS, **config}
+
+def selected_models(config):
+    """The MODELS_TO_RUN entries of the config's models, with stores inside the output directory."""
+    from batch_run import MODELS_TO_RUN
+    by_name = {m["class"].__name__: m for m in MODELS_TO_RUN}
+    names = config["models"] or list(by_name)
+    unknown = [name for name in names if name not in by_name]
+    if unknown: raise ValueError(f"Unknown models: {unknown}; choose from {list(by_name)}")
+    return [{**by_name[name], "store": os.path.join(config["output"], by_name[name]["store"])} for name in names]
+
+####
+
+# --- Subcommands ---
+
+def run(config):
+    """Runs the batch of every configured model into its result store."""
+    from batch_run import run_simulation
+    from cache import ResultCache
+
+    os.makedirs(config["output"], exist_ok=True)
+    with open(os.path.join(config["output"], "config.json"), "w") as f: json.dump(config, f, indent=1)
+    cache = ResultCache(config["cache"]) if config["cache"] else None
+    for model_info in selected_models(config):
+        start = time.perf_counter()
+        run_simulation(
+            model_class=model_info["class"],
+            max_iterations=config["iterations"],
+            max_steps=config["steps"],
+            output_path=model_info["store"],
+            model_title=model_info["title"],
+            engine=config["engine"],
+            master_seed=config["master_seed"],
+            workers=config["workers"],
+            cache=cache,
+            precision=config["precision"],
+            profile=config["profile"],
+            track=config["track"],
+            params=config["params"],
+        )
+        print(f"Finished {model_info['title']} in {time.perf_counter() - start:.1f} s")
+
+def report(config, show=False):
+    """
+    Writes the figures of plots.py, a per-model summary of cumulative resistant cases and, for more than one
+    model, the paired differences with the first model into the output directory. Plots are drawn off-screen
+    unless show=True, so reports can be made on machines without a display. Figures and tables whose columns
+    a tracked run did not store are skipped; figures are labelled with the staffing ratio the runs used.
+    """
+    import matplotlib
+    if not show: matplotlib.use("Agg")
+    import pandas as pd
+    import plots
+    from batch_run import paired_differences
+    from results import ResultStore
+
+    models_to_run = [m for m in selected_models(config) if ResultStore(m["store"]).completed()]
+    if not models_to_run: raise SystemExit(f"No results in {config['output']}; run them first")
+    aggregates = plots.load_aggregates(models_to_run)
+    output = config["output"]
+    ratios = {plots.staff_ratio(m["store"]) for m in models_to_run}
+    ratio = ratios.pop() if len(ratios) == 1 else None
+
+    # Runs with `track` store a subset of the columns: skip whatever needs columns the stores do not have
+    written = 0
+    for name, plot, columns in [("incidence.png", plots.plot_incidence, plots.INCIDENCE_COLUMNS), ("cumulative_resistant.png", plots.plot_cumulative, plots.CUMULATIVE_COLUMNS)]:
+        missing = plots.missing_columns(aggregates, columns)
+        if missing:
+            print(f"Skipping {name}: the results do not have {missing}")
+            continue
+        plot(aggregates, None if show else os.path.join(output, name), ratio=ratio)
+        written += 1
+
+    if plots.missing_columns(aggregates, ["Cumulative_Resistant"]):
+        print("Skipping summary.csv and paired_differences.csv: the results do not have New_Colonized_R and New_Infected_R")
+    else:
+        rows = []
+        for title, aggregator in aggregates.items():
+            final = aggregator.band("Cumulative_Resistant").iloc[-1]
+            rows.append({"Model": title, "Iterations": aggregator.n, "Cumulative_Resistant": final["Mean"], "CI_Low": final["Low"], "CI_High": final["High"]})
+        summary = pd.DataFrame(rows).set_index("Model")
+        summary.to_csv(os.path.join(output, "summary.csv"))
+        print(summary)
+        written += 1
+
+        if len(models_to_run) > 1:
+            runs = {m["title"]: ResultStore(m["store"]).load(["New_Colonized_R", "New_Infected_R"]) for m in models_to_run}
+            paired = paired_differences(runs, reference=models_to_run[0]["title"])
+            paired.to_csv(os.path.join(output, "paired_differences.csv"))
+            print(f"Paired differences in cumulative resistant cases versus the {models_to_run[0]['title']}:")
+            print(paired)
+    if not written: raise SystemExit(f"Nothing to report for {output}: the results lack every column the report needs")
+    print(f"Saved report to {output}")
+
+####
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run batches of the hospital models headlessly and report on them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the batches described by a config file")
+    run_parser.add_argument("config", help="JSON or TOML run config")
+    report_parser = commands.add_parser("report", help="write figures and summary tables for finished batches")
+    report_parser.add_argument("config", help="the run config, or the config.json saved in its output directory")
+    report_parser.add_argument("--show", action="store_true", help="show figures on screen instead of saving them")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.command == "run": run(config)
+    else: report(config, show=args.show)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import math
+import numpy as np
+import pandas as pd
+from scipy import stats
+from mesa import Model
+from mesa.datacollection import DataCollector
+from agents import STATE_NAMES, STATE_CODES
+from models import PARAMS, NoWardModel, resistance_can_reenter
+from parallel import run_batch
+from transmission import TransmissionKernel
+
+####
+
+# --- Compartments ---
+S, CP_S, CP_R, IP_S, IP_R, R = (STATE_CODES[name] for name in STATE_NAMES)
+NURSE_STATES = ["U", "Cn_s", "Cn_r"]
+U, CN_S, CN_R = range(len(NURSE_STATES))
+
+####
+
+class CountNoWardModel(Model):
+    """
+    NoWardModel as compartment counts advanced by binomial and multinomial draws (tau-leaping with a leap of one step).
+    Every patient of a well-mixed hospital is exchangeable, so counts per state carry the whole population; each step
+    applies the rules of Patient.step, Nurse.step and handle_granular_interactions to the counts, in the same order,
+    and reports the same columns as the agent-based model.
+    """
+    def __init__(self, num_nurses=150, seed=None, **params):
+        super().__init__(seed=seed)
+        self.params = {**PARAMS, **params}
+        self.kernel = TransmissionKernel(self.params, self.rng)
+
+        ratio = self.params.get("target_patient_to_nurse_ratio")
+        if ratio and ratio > 0:
+            self.num_nurses = math.ceil(self.params["initial_patients"] / ratio)
+        else:
+            self.num_nurses = num_nurses
+
+        self.running = True
+        self.discharged = {state: 0 for state in STATE_NAMES[:R]}
+        self.patients = self.draw_initial_states(self.params["initial_patients"])  # active patients by state code S..Ip_r
+        self.nurses = np.array([self.num_nurses, 0, 0])  # nurses by NURSE_STATES
+        self.compliance = 1.0  # every nurse shares the hospital-wide workload, hence one compliance
+        self.changes = {}  # (state at start of step, current state) -> patients, as in Census.changes
+        self.removed = 0
+
+        self.datacollector = DataCollector(
+            model_reporters={
+                "Current_Patients": lambda m: int(m.patients.sum()),
+                "Susceptible": lambda m: int(m.patients[S]),
+                "Colonized_S": lambda m: int(m.patients[CP_S]),
+                "Infected_S": lambda m: int(m.patients[IP_S]),
+                "Colonized_R": lambda m: int(m.patients[CP_R]),
+                "Infected_R": lambda m: int(m.patients[IP_R]),
+                "New_Colonized_S": lambda m: m.changes.get((S, CP_S), 0),
+                "New_Infected_S": lambda m: m.changes.get((S, IP_S), 0),
+                "New_Colonized_R": lambda m: m.changes.get((S, CP_R), 0),
+                "New_Infected_R": lambda m: m.changes.get((S, IP_R), 0),
+                "Resistance_Emergence": lambda m: m.changes.get((IP_S, IP_R), 0),
+                "Average_Nurse_Workload_Factor": lambda m: m.calculate_workload_factor(),
+            }
+        )
+
+    def draw_initial_states(self, n):
+        params = self.params
+        p = np.zeros(R)
+        p[CP_R], p[CP_S], p[IP_R], p[IP_S] = params["lambda_cr"], params["lambda_cs"], params["lambda_ir"], params["lambda_is"]
+        p[S] = 1 - p.sum()
+        return self.rng.multinomial(n, p)
+
+    def calculate_workload_factor(self):
+        return self.patients.sum() / self.num_nurses if self.num_nurses > 0 else 0.0
+
+    def resistance_absorbed(self):
+        """NoWardModel.resistance_absorbed on the counts."""
+        return not (self.patients[CP_R] or self.patients[IP_R] or self.nurses[CN_R] or resistance_can_reenter(self.params))
+
+    def move(self, start, source, target, n):
+        """Moves n patients who began the step in `start` from state source to state target."""
+        self.patients[source] -= n
+        if target == R:  # discharged patients leave the counts straight away
+            self.removed += n
+            self.discharged[STATE_NAMES[start]] += n
+        else:
+            self.patients[target] += n
+        if start != source: self.changes[start, source] -= n
+        if start != target: self.changes[start, target] = self.changes.get((start, target), 0) + n
+
+    def advance_patients(self):
+        """Patient.step on counts: each cohort of the same starting state goes through the same sequence of draws."""
+        params = self.params
+        binomial = self.rng.binomial
+        start = self.patients.copy()
+
+        # Colonised patients progress to infection, then infected patients follow the same path as those already infected
+        progressed_s = binomial(start[CP_S], params["kappa"] * params["m_s"])
+        progressed_r = binomial(start[CP_R], params["kappa"] * params["m_s"] * (1 + params["delta_m"]))
+        self.move(CP_S, CP_S, IP_S, progressed_s)
+        self.move(CP_R, CP_R, IP_R, progressed_r)
+        self.move(CP_S, CP_S, R, binomial(start[CP_S] - progressed_s, params["mu_c"]))
+        self.move(CP_R, CP_R, R, binomial(start[CP_R] - progressed_r, params["mu_c"]))
+
+        for origin, infected in [(IP_S, start[IP_S]), (CP_S, progressed_s)]:
+            treated = binomial(infected, params["psi_s"] * params["iota"])
+            left = binomial(infected - treated, params["psi_s"] * (1 - params["iota"]))
+            self.move(origin, IP_S, R, treated + left)
+            self.move(origin, IP_S, IP_R, binomial(infected - treated - left, params["prob_resistance_emergence"]))
+        for origin, infected in [(IP_R, start[IP_R]), (CP_R, progressed_r)]:
+            treated = binomial(infected, params["psi_r"] * params["iota"] * (1 - params["s_p"]))
+            left = binomial(infected - treated, params["psi_r"] * (1 - (params["iota"] * (1 - params["s_p"]))))
+            self.move(origin, IP_R, R, treated + left)
+
+    def advance_nurses(self):
+        """Nurse.step on counts: contaminated nurses clean their hands with probability base_delta * compliance."""
+        params = self.params
+        base_delta = (1 - params["theta"]) * params["low"] + params["theta"] * params["high"]
+        for state in (CN_S, CN_R):
+            cleaned = self.rng.binomial(self.nurses[state], base_delta * self.compliance)
+            self.nurses[state] -= cleaned
+            self.nurses[U] += cleaned
+
+    def admit(self, n):
+        self.patients += self.draw_initial_states(n)
+
+    def handle_granular_interactions(self):
+        """
+        Nurses visit in random order; each meets min(nurse_max_interactions, patients) distinct patients, drawn one at a
+        time without replacement from the current counts. Contacts are resolved as in TransmissionKernel.resolve, and
+        colonised patients update the counts seen by the next nurse. The loop runs over plain ints, with every uniform
+        of the step drawn in one call, as it handles only a few contacts per nurse.
+        """
+        params = self.params
+        num_patients = int(self.patients.sum())
+        if num_patients == 0 or self.num_nurses == 0: return
+        self.compliance = max(0.0, 1.0 - self.calculate_workload_factor() * params["compliance_decrease_rate"])
+        k = min(params["nurse_max_interactions"], num_patients)
+        kernel = self.kernel
+        p_pn = (kernel.p_pn * self.compliance).tolist()
+        p_np = [0.0, kernel.p_np["Cn_s"], kernel.p_np["Cn_r"]]
+        new_state = [None, (CP_S, IP_S), (CP_R, IP_R)]  # (colonised, infected) by nurse state
+
+        nurse_states = self.rng.permutation(np.repeat(np.arange(len(NURSE_STATES)), self.nurses)).tolist()
+        draws = self.rng.random((len(nurse_states), k, 4)).tolist()
+        counts = self.patients.tolist()
+        colonised = {}
+        for j, nurse_state in enumerate(nurse_states):
+            remaining, left = counts[:], num_patients
+            for u_pick, u_pn, u_np, u_x in draws[j]:
+                r = u_pick * left
+                for state in range(R):
+                    r -= remaining[state]
+                    if r < 0: break
+                remaining[state] -= 1
+                left -= 1
+                if nurse_state == U:
+                    if u_pn < p_pn[state]: nurse_state = CN_S if state in (CP_S, IP_S) else CN_R
+                elif state == S and u_np < p_np[nurse_state]:
+                    target = new_state[nurse_state][u_x < kernel.x]
+                    counts[S] -= 1
+                    counts[target] += 1
+                    colonised[target] = colonised.get(target, 0) + 1
+            nurse_states[j] = nurse_state
+
+        for target, n in colonised.items(): self.move(S, S, target, n)
+        self.nurses = np.bincount(nurse_states, minlength=len(NURSE_STATES))
+
+    def step(self):
+        self.changes = {}
+        self.removed = 0
+        self.advance_patients()
+        self.advance_nurses()
+        current_patients = int(self.patients.sum())
+        num_to_admit = min(self.params["admission_rate_per_step"], self.params["max_patient_capacity"] - current_patients) if current_patients < self.params["max_patient_capacity"] else self.removed
+        self.admit(num_to_admit)
+        self.handle_granular_interactions()
+        self.datacollector.collect(self)
+
+####
+
+# --- Agent-based model -> count engine ---
+COUNT_MODELS = {
+    NoWardModel: CountNoWardModel,
+}
+
+####
+
+# --- Equivalence with the agent-based model ---
+
+def equivalence_check(max_steps=365, replicates=200, master_seed=0, workers=None, burn_in=50, alpha=0.05, max_effect=0.5, **params):
+    """
+    Runs NoWardModel and CountNoWardModel for `replicates` seeded iterations each and compares, column by column,
+    the per-iteration means over steps after burn_in. Returns a DataFrame with both means, their difference, the
+    standardized difference (over the pooled standard deviation of the iteration means), the p-values of Welch's
+    t-test and of the two-sample Kolmogorov-Smirnov test, and the TOST p-value: the larger of the two one-sided
+    Welch tests that the difference lies within +-max_effect pooled standard deviations. A column passes when its
+    TOST p-value is below alpha, i.e. when the data show the engines agree, not merely that no difference was found;
+    the run passes at level alpha when every column does. With 200 replicates a column passes when its observed
+    standardized difference is within about +-0.33, and with 30 replicates only within about +-0.07.
+    """
+    runs = {}
+    for name, model_class in [("Agent", NoWardModel), ("Count", CountNoWardModel)]:
+        results = run_batch(model_class, replicates, max_steps, master_seed=master_seed, workers=workers, **params)
+        runs[name] = pd.DataFrame([df.iloc[burn_in:].mean() for df in results])
+
+    rows = []
+    for column in runs["Agent"].columns:
+        agent, count = runs["Agent"][column], runs["Count"][column]
+        difference = count.mean() - agent.mean()
+        pooled = math.sqrt((agent.var() + count.var()) / 2)
+        if pooled > 0:
+            margin = max_effect * pooled
+            tost = max(stats.ttest_ind(count + margin, agent, equal_var=False, alternative="greater").pvalue,
+                       stats.ttest_ind(count - margin, agent, equal_var=False, alternative="less").pvalue)
+        else:
+            tost = 0.0 if difference == 0 else 1.0
+        rows.append({
+            "Column": column,
+            "Agent_Mean": agent.mean(),
+            "Count_Mean": count.mean(),
+            "Difference": difference,
+            "Standardized_Difference": difference / pooled if pooled > 0 else (0.0 if difference == 0 else math.copysign(math.inf, difference)),
+            "T_P_Value": stats.ttest_ind(agent, count, equal_var=False).pvalue if pooled > 0 else 1.0,
+            "KS_P_Value": stats.ks_2samp(agent, count).pvalue,
+            "TOST_P_Value": tost,
+        })
+    report = pd.DataFrame(rows).set_index("Column")
+    report["Passed"] = report["TOST_P_Value"] < alpha
+    return report
+
+####
+
+# --- Equivalence check: exits non-zero unless every column is shown equivalent ---
+if __name__ == "__main__":
+    import sys
+    report = equivalence_check(master_seed=2025)
+    with pd.option_context("display.width", 200, "display.max_columns", None): print(report)
+    failed = report.index[~report["Passed"]].tolist()
+    print(f"Not shown equivalent within +-0.5 SD: {failed}" if failed else "Count engine is equivalent to the agent-based model within +-0.5 SD in every column")
+    sys.exit(1 if failed else 0)
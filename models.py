@@ -1,9 +1,351 @@
+import heapq
+import math
+import random
+import time
+from array import array
+from collections import Counter, defaultdict
+import numpy as np
+import pandas as pd
+from mesa import Model
+from mesa.datacollection import DataCollector
+from agents import Patient, Nurse, STATE_NAMES, STATE_CODES
+from transmission import TransmissionKernel
+
+####
+
+# --- Model Parameters ---
+PARAMS = {
+    "a": 5.0, "x": 0.2, "n": 0.3, "s_b": 0.25, "s_p": 0.1,
+    "theta": 0.8, "low": 0.1, "high": 0.5,
+    "psi_s": 0.0833, "psi_r": 0.0454, "iota": 0.8,
+    "kappa": 0.1428, "m_s": 0.3, "delta_m": 0.25,
+    "mu_c": 0.015, "b_np": 0.09, "b_pn": 0.3,
+    "lambda_cs": 0.02, "lambda_cr": 0.02,
+    "lambda_is": 0.01, "lambda_ir": 0.01,
+    # Granular model parameters
+    "nurse_max_interactions": 7,
+    "compliance_decrease_rate": 0.05,
+    "prob_resistance_emergence": 0.001,
+    "initial_patients": 275,
+    "max_patient_capacity": 400,
+    "admission_rate_per_step": 10,
+    # Admission/Cohort model parameters
+    "admission_ward_id": 0,
+    "resistant_cohort_ward_id": 1,
+    "admission_period": 3,
+    "compliance_boost": 0.25,
+    # Nurse ratio control
+    "target_patient_to_nurse_ratio": 10 # Set > 0 to control ratio (e.g., 4 for 1:4). If 0, uses fixed num_nurses.
+}
+
+def resistance_can_reenter(params):
+    """Whether the resistant strain can come back once gone: through resistant admissions or emergence under treatment."""
+    return params["lambda_cr"] > 0 or params["lambda_ir"] > 0 or params["prob_resistance_emergence"] > 0
+
+####
+
+class Census:
+    """
+    Running patient counts by state and by (ward, state), the net state changes of the current step,
+    and an index of the active (non-"R") patients in each ward.
+    """
+    ACTIVE_STATES = ["S", "Cp_s", "Cp_r", "Ip_s", "Ip_r"]
+
+    def __init__(self):
+        self.counts = Counter()
+        self.ward_counts = Counter()
+        self.changes = Counter()  # (state at start of step, current state) -> patients
+        self.members = defaultdict(dict)  # ward_id -> {patient: None}, in the order patients entered the ward
+        self.leaving = []  # patients discharged since the last call to NoWardModel.retire_discharged_patients
+        self.log = None  # optional StateLog receiving every admission and state change
+
+    def start_step(self):
+        self.changes.clear()
+
+    def admit(self, patient):
+        self.counts[patient.state] += 1
+        self.ward_counts[patient.ward_id, patient.state] += 1
+        if patient.state != "R": self.members[patient.ward_id][patient] = None
+        if self.log is not None: self.log.record(patient.model.steps, patient.unique_id, None, patient.state)
+
+    def discharge(self, patient):
+        self.counts[patient.state] -= 1
+        self.ward_counts[patient.ward_id, patient.state] -= 1
+        self.members[patient.ward_id].pop(patient, None)
+
+    def change_state(self, patient, state):
+        self.counts[patient.state] -= 1
+        self.ward_counts[patient.ward_id, patient.state] -= 1
+        if patient.state != patient.prev_state: self.changes[patient.prev_state, patient.state] -= 1
+        if state != patient.prev_state: self.changes[patient.prev_state, state] += 1
+        self.counts[state] += 1
+        self.ward_counts[patient.ward_id, state] += 1
+        if state == "R":
+            self.members[patient.ward_id].pop(patient, None)
+            self.leaving.append(patient)
+        if self.log is not None: self.log.record(patient.model.steps, patient.unique_id, patient.state, state)
+
+    def change_ward(self, patient, ward_id):
+        self.ward_counts[patient.ward_id, patient.state] -= 1
+        self.ward_counts[ward_id, patient.state] += 1
+        if patient in self.members[patient.ward_id]:
+            del self.members[patient.ward_id][patient]
+            self.members[ward_id][patient] = None
+
+    def reorder(self, patients):
+        """Re-enters active patients in each ward's index in the given order, e.g. when restoring a snapshot."""
+        for p in patients:
+            ward = self.members[p.ward_id]
+            if p in ward: ward[p] = ward.pop(p)
+
+    def patients_in_ward(self, ward_id):
+        """Active patients in ward_id (ward None holds every patient of a model without wards)."""
+        return list(self.members[ward_id])
+
+    def in_hospital(self, ward_id=None):
+        if ward_id is None: return sum(self.counts[s] for s in self.ACTIVE_STATES)
+        return sum(self.ward_counts[ward_id, s] for s in self.ACTIVE_STATES)
+
+    def discharged_this_step(self):
+        return sum(n for (_, state), n in self.changes.items() if state == "R")
+
+    def verify(self, model):
+        """Recounts every patient in the schedule and raises RuntimeError if a running counter disagrees."""
+        patients = [a for a in model.schedule if isinstance(a, Patient)]
+        recount = {
+            "counts": Counter(p.state for p in patients),
+            "ward_counts": Counter((p.ward_id, p.state) for p in patients),
+            "changes": Counter((p.prev_state, p.state) for p in patients if p.prev_state != p.state),
+        }
+        members = {ward_id: set(ward) for ward_id, ward in self.members.items() if ward}
+        expected_members = defaultdict(set)
+        for p in patients:
+            if p.state != "R": expected_members[p.ward_id].add(p)
+        if members != expected_members:
+            raise RuntimeError(f"Census ward index out of sync at step {model.steps}")
+        for name, expected in recount.items():
+            if +expected != +getattr(self, name):
+                raise RuntimeError(f"Census {name} out of sync at step {model.steps}: expected {dict(+expected)}, got {dict(+getattr(self, name))}")
+        for state in ["Cp_s", "Ip_s", "Cp_r", "Ip_r"]:
+            newly_infected = sum(1 for p in patients if p.newly_infected and p.state == state)
+            if newly_infected != self.changes["S", state]:
+                raise RuntimeError(f"Census new {state} out of sync at step {model.steps}: expected {newly_infected}, got {self.changes['S', state]}")
+
+####
+
+class StateLog:
+    """Delta-encoded patient state record: one (step, agent_id, from, to) row per admission or state change."""
+    COLUMNS = {"step": ("i", np.int32), "agent_id": ("q", np.int64), "from_state": ("b", np.int8), "to_state": ("b", np.int8)}
+    NOT_ADMITTED = -1
+
+    def __init__(self):
+        for name, (typecode, _) in self.COLUMNS.items():
+            setattr(self, name, array(typecode))
+
+    def __len__(self):
+        return len(self.step)
+
+    def record(self, step, agent_id, from_state, to_state):
+        self.step.append(step)
+        self.agent_id.append(agent_id)
+        self.from_state.append(self.NOT_ADMITTED if from_state is None else STATE_CODES[from_state])
+        self.to_state.append(STATE_CODES[to_state])
+
+    def columns(self):
+        return {name: np.array(getattr(self, name), dtype=dtype) for name, (_, dtype) in self.COLUMNS.items()}
+
+    def save(self, path):
+        """Writes the log as a compressed .npz file with one array per column."""
+        np.savez_compressed(path, states=np.array(STATE_NAMES), **self.columns())
+
+    @classmethod
+    def load(cls, path):
+        log = cls()
+        with np.load(path) as data:
+            for name, (_, dtype) in cls.COLUMNS.items():
+                getattr(log, name).frombytes(data[name].astype(dtype).tobytes())
+        return log
+
+    def trajectories(self):
+        """Rebuilds each patient's path as a list of (step, state) pairs, starting with its admission."""
+        paths = {}
+        for step, agent_id, to_state in zip(self.step, self.agent_id, self.to_state):
+            paths.setdefault(agent_id, []).append((step, STATE_NAMES[to_state]))
+        return paths
+
+####
+
+class StepProfiler:
+    """
+    Opt-in per-step metrics: wall time, agents touched and random draws of each phase of the step.
+    Draws are counted on the model's stdlib and NumPy generators and on the patients' and admission streams.
+    """
+    PHASES = ["triage", "agents", "admissions", "interactions", "verify", "collect", "retire", "admission_days"]
+    METRICS = ["seconds", "touched", "draws"]
+
+    def __init__(self, model):
+        self.model = model
+        self.draws = 0  # running total, incremented by CountingRandom and CountingGenerator
+        self.rows = []  # one dict per step: Step and <phase>_<metric>
+        self.phase = None
+        self.started = 0.0
+        self.draws_at_start = 0
+
+    def mark(self, phase, touched=0):
+        """Ends the running phase and starts timing `phase` of the current step."""
+        now = time.perf_counter()
+        self.stop(now)
+        if not self.rows or self.rows[-1]["Step"] != self.model.steps: self.rows.append({"Step": self.model.steps})
+        self.phase, self.started, self.draws_at_start = phase, now, self.draws
+        self.touch(touched)
+
+    def touch(self, n):
+        """Adds n agents touched to the running phase."""
+        row = self.rows[-1]
+        row[self.phase + "_touched"] = row.get(self.phase + "_touched", 0) + n
+
+    def stop(self, now=None):
+        """Ends the running phase, adding its wall time and draws to the current step."""
+        if self.phase is None: return
+        elapsed = (time.perf_counter() if now is None else now) - self.started
+        row = self.rows[-1]
+        row[self.phase + "_seconds"] = row.get(self.phase + "_seconds", 0.0) + elapsed
+        row[self.phase + "_draws"] = row.get(self.phase + "_draws", 0) + self.draws - self.draws_at_start
+        self.phase = None
+
+    def to_frame(self):
+        """Metrics of every step so far, one row per step; phases the model does not have are left out."""
+        df = pd.DataFrame(self.rows).set_index("Step").fillna(0)
+        return df[[f"{phase}_{metric}" for phase in self.PHASES for metric in self.METRICS if f"{phase}_{metric}" in df]]
+
+    @classmethod
+    def summary(cls, frames):
+        """
+        Per-phase means over every step of the given to_frame() tables (e.g. one per iteration): milliseconds,
+        share of the step's wall time, agents touched and random draws.
+        """
+        df = pd.concat(frames).fillna(0)
+        phases = [phase for phase in cls.PHASES if phase + "_seconds" in df]
+        step_seconds = df[[phase + "_seconds" for phase in phases]].sum(axis=1).mean()
+        rows = [{
+            "Phase": phase,
+            "Milliseconds": df[phase + "_seconds"].mean() * 1000,
+            "Share": df[phase + "_seconds"].mean() / step_seconds if step_seconds > 0 else np.nan,
+            "Agents_Touched": df[phase + "_touched"].mean(),
+            "RNG_Draws": df[phase + "_draws"].mean(),
+        } for phase in phases]
+        return pd.DataFrame(rows).set_index("Phase")
+
+class CountingRandom(random.Random):
+    """random.Random that counts every value it draws into profiler.draws; the sequence is unchanged."""
+    def __init__(self, x=None, profiler=None):
+        self.profiler = profiler
+        super().__init__(x)
+
+    def random(self):
+        self.profiler.draws += 1
+        return super().random()
+
+    def getrandbits(self, k):
+        self.profiler.draws += 1
+        return super().getrandbits(k)
+
+class CountingGenerator:
+    """
+    Wraps a NumPy Generator, counting into profiler.draws every value its methods return (integers, permuted,
+    random, ...), or the values shuffle() permutes in place; the sequence is unchanged.
+    """
+    NOT_DRAWS = {"spawn"}
+
+    def __init__(self, rng, profiler):
+        self.rng = rng
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        attr = getattr(self.rng, name)
+        if name in self.NOT_DRAWS or not callable(attr): return attr
+        def counted(*args, **kwargs):
+            values = attr(*args, **kwargs)
+            self.profiler.draws += int(np.size(args[0] if values is None else values))
+            return values
+        return counted
+
+####
+
+class NurseAssignments:
+    """
+    Patients assigned to each nurse, with a patient -> nurse reverse map and a lazy min-heap of nurse loads per ward.
+    A nurse's load counts every patient on its list, so patients discharged this step count until they are unassigned.
+    """
+    def __init__(self, nurses_by_ward):
+        self.patients = {}  # nurse unique_id -> {patient: None}, in assignment order
+        self.nurse_of = {}  # patient -> nurse unique_id
+        self.ward_of = {}
+        self.rank = {}  # position within the ward, so ties go to the earliest nurse as with min() over the nurse list
+        self.heaps = {}
+        self.nurses = {ward_id: [n.unique_id for n in nurses] for ward_id, nurses in nurses_by_ward.items()}
+        for ward_id, nurses in nurses_by_ward.items():
+            for rank, n in enumerate(nurses):
+                self.patients[n.unique_id] = {}
+                self.ward_of[n.unique_id] = ward_id
+                self.rank[n.unique_id] = rank
+            self.heaps[ward_id] = [(0, rank, n.unique_id) for rank, n in enumerate(nurses)]
+
+    def load(self, nurse_id):
+        return len(self.patients[nurse_id])
+
+    def assign(self, patient, nurse_id):
+        self.patients[nurse_id][patient] = None
+        self.nurse_of[patient] = nurse_id
+        self._push(nurse_id)
+
+    def unassign(self, patient):
+        nurse_id = self.nurse_of.pop(patient, None)
+        if nurse_id is None: return
+        del self.patients[nurse_id][patient]
+        self._push(nurse_id)
+
+    def _push(self, nurse_id):
+        ward_id = self.ward_of[nurse_id]
+        heap = self.heaps[ward_id]
+        heapq.heappush(heap, (self.load(nurse_id), self.rank[nurse_id], nurse_id))
+        # Stale entries are dropped lazily; rebuild once they clearly outnumber the ward's nurses
+        ward_nurses = self.nurses[ward_id]
+        if len(heap) > 4 * len(ward_nurses) + 16:
+            heap[:] = [(self.load(nid), self.rank[nid], nid) for nid in ward_nurses]
+            heapq.heapify(heap)
+
+    def least_burdened(self, ward_id):
+        """Returns the id of the nurse in ward_id with the fewest assigned patients, or None if the ward has no nurses."""
+        heap = self.heaps.get(ward_id)
+        while heap:
+            load, _, nurse_id = heap[0]
+            if load == self.load(nurse_id): return nurse_id
+            heapq.heappop(heap)
+        return None
+
 ####
 
 class NoWardModel(Model):
-    def __init__(self, num_nurses=150, **params):
-        super().__init__()
+    def __init__(self, num_nurses=150, check_counters=False, record_states=False, profile=False, seed=None, **params):
+        super().__init__(seed=seed)  # all draws go through self.random or self.streams so a seed fixes the whole run
         self.params = {**PARAMS, **params}
+        self.profiler = StepProfiler(self) if profile else None  # per-phase metrics are opt-in, like state_log
+        if self.profiler:
+            # Count draws on the generators Mesa created; the class swap keeps their state and every reference to them
+            self.random.__class__ = CountingRandom
+            self.random.profiler = self.profiler
+        self.kernel = TransmissionKernel(self.params, CountingGenerator(self.rng, self.profiler) if self.profiler else self.rng)
+        self.check_counters = check_counters  # recount the population every step to validate the census
+        self.census = Census()
+        self.state_log = StateLog() if record_states else None  # agent-level recording is opt-in
+        self.census.log = self.state_log
+
+        # Substreams for initial states, ward placement and each patient's disease course. They depend only on
+        # the seed, so every model class run with the same seed sees the same draws (common random numbers).
+        self.stream_seed = seed if seed is not None else self.random.getrandbits(64)
+        self.streams = {name: self.new_stream(name) for name in ["initial", "admission", "transfer"]}
+        self.admitted = 0
 
         ratio = self.params.get("target_patient_to_nurse_ratio")
         if ratio and ratio > 0:
@@ -13,6 +355,7 @@ class NoWardModel(Model):
 
         self.schedule = self.agents
         self.running = True
+        self.discharged = {state: 0 for state in Census.ACTIVE_STATES}
 
         for i in range(self.params["initial_patients"]):
             p = Patient(self)
@@ -21,77 +364,129 @@ class NoWardModel(Model):
         for i in range(self.num_nurses):
             n = Nurse(self)
             self.schedule.add(n)
+        self.nurses_by_ward = self.index_nurses()
 
         self.datacollector = DataCollector(
-            agent_reporters={"State": "state"},
             model_reporters={
-                "Current_Patients": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.state != "R"),
-                "Susceptible": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.state == "S"),
-                "Colonized_S": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.state == "Cp_s"),
-                "Infected_S": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.state == "Ip_s"),
-                "Colonized_R": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.state == "Cp_r"),
-                "Infected_R": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.state == "Ip_r"),
-                "New_Colonized_S": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.newly_infected and a.state == "Cp_s"),
-                "New_Infected_S": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.newly_infected and a.state == "Ip_s"),
-                "New_Colonized_R": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.newly_infected and a.state == "Cp_r"),
-                "New_Infected_R": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.newly_infected and a.state == "Ip_r"),
-                "Resistance_Emergence": lambda m: sum(1 for a in m.schedule if isinstance(a, Patient) and a.state == "Ip_r" and a.prev_state == "Ip_s"),
+                "Current_Patients": lambda m: m.census.in_hospital(),
+                "Susceptible": lambda m: m.census.counts["S"],
+                "Colonized_S": lambda m: m.census.counts["Cp_s"],
+                "Infected_S": lambda m: m.census.counts["Ip_s"],
+                "Colonized_R": lambda m: m.census.counts["Cp_r"],
+                "Infected_R": lambda m: m.census.counts["Ip_r"],
+                "New_Colonized_S": lambda m: m.census.changes["S", "Cp_s"],
+                "New_Infected_S": lambda m: m.census.changes["S", "Ip_s"],
+                "New_Colonized_R": lambda m: m.census.changes["S", "Cp_r"],
+                "New_Infected_R": lambda m: m.census.changes["S", "Ip_r"],
+                "Resistance_Emergence": lambda m: m.census.changes["Ip_s", "Ip_r"],
                 "Average_Nurse_Workload_Factor": lambda m: m.calculate_workload_factor(),
             }
         )
 
+    def index_nurses(self):
+        """Groups nurses by ward_id. Nurses never change ward, so this is rebuilt only when wards are assigned."""
+        nurses_by_ward = defaultdict(list)
+        for n in self.agents_by_type.get(Nurse, []): nurses_by_ward[n.ward_id].append(n)
+        return nurses_by_ward
+
+    def new_stream(self, name):
+        """A stdlib RNG seeded from stream_seed and name."""
+        seed = f"{self.stream_seed}-{name}"
+        return CountingRandom(seed, self.profiler) if self.profiler else random.Random(seed)
+
+    def patient_random(self):
+        """Returns the disease-course RNG of the next admitted patient."""
+        self.admitted += 1
+        return self.new_stream(f"patient-{self.admitted}")
+
     def add_new_patient(self):
-        """Adds a new patient to the model."""
+        """Adds a new patient to the model and returns it."""
         p = Patient(self)
         self.schedule.add(p)
+        return p
+
+    def transfer_ward(self):
+        """Ward a patient transferred in from another hospital is admitted to."""
+        return None
+
+    def admit_transfer(self, state):
+        """Admits a patient transferred from another hospital in the given state, and returns it."""
+        p = Patient(self, ward_id=self.transfer_ward(), state=state)
+        self.schedule.add(p)
+        return p
+
+    def transfer_out(self, patient):
+        """Removes an active patient transferred to another hospital; transfers are not tallied as discharges."""
+        patient.remove()
+
+    def retire_discharged_patients(self):
+        """Removes discharged patients from the schedule, tallying the state each one left in."""
+        leaving, self.census.leaving = self.census.leaving, []
+        for p in leaving:
+            self.discharged[p.prev_state] += 1
+            p.remove()
+
+    def resistance_absorbed(self):
+        """
+        True once no patient carries the resistant strain, no nurse is contaminated with it and it cannot re-enter;
+        from then on every resistant count and incidence column stays 0.
+        """
+        if self.census.counts["Cp_r"] or self.census.counts["Ip_r"] or resistance_can_reenter(self.params): return False
+        return not any(n.state == "Cn_r" for n in self.agents_by_type.get(Nurse, ()))
 
     def calculate_workload_factor(self):
-        patients_in_hospital = sum(1 for a in self.schedule if isinstance(a, Patient) and a.state != "R")
-        nurses_on_duty = sum(1 for a in self.schedule if isinstance(a, Nurse))
+        patients_in_hospital = self.census.in_hospital()
+        nurses_on_duty = len(self.agents_by_type.get(Nurse, ()))
         return patients_in_hospital / nurses_on_duty if nurses_on_duty > 0 else 0.0
 
-    def handle_granular_interactions(self):
-        patients = [a for a in self.schedule if isinstance(a, Patient) and a.state != "R"]
-        nurses = [a for a in self.schedule if isinstance(a, Nurse)]
-        params = self.params
-        if not patients or not nurses: return
+    def ward_contacts(self, ward_id, nurses):
+        """Patients of the ward and, per nurse, the indices of the ones it meets; None skips the ward."""
+        patients = self.census.patients_in_ward(ward_id)
+        if not patients or not nurses: return None
+        return patients, self.kernel.sample_contacts(len(nurses), len(patients), self.params["nurse_max_interactions"])
 
+    def update_ward_compliance(self, ward_id, nurses):
         workload_factor = self.calculate_workload_factor()
         for nurse in nurses: nurse.update_compliance(workload_factor)
 
-        random.shuffle(patients)
-        for nurse in nurses:
-            num_interactions = min(params["nurse_max_interactions"], len(patients))
-            if num_interactions <= 0: continue
-            patients_to_interact = random.sample(patients, num_interactions)
-
-            for patient in patients_to_interact:
-                base_prob_pn = params["a"] * params["b_pn"] * (1 - params["theta"])
-                if nurse.state == "U":
-                    if patient.state in ["Cp_s", "Ip_s"] and random.random() < base_prob_pn * (params["n"] if patient.state == "Cp_s" else 1.0) * nurse.compliance:
-                        nurse.state = "Cn_s"
-                    elif patient.state in ["Cp_r", "Ip_r"] and random.random() < base_prob_pn * (1 - params["s_b"]) * (params["n"] if patient.state == "Cp_r" else 1.0) * nurse.compliance:
-                        nurse.state = "Cn_r"
-
-                base_prob_np = params["a"] * params["b_np"] * (1 - params["theta"])
-                if patient.state == "S":
-                    if nurse.state == "Cn_s" and random.random() < base_prob_np:
-                        patient.state = "Ip_s" if random.random() < params["x"] else "Cp_s"
-                        patient.newly_infected = True
-                    elif nurse.state == "Cn_r" and random.random() < base_prob_np * (1 - params["s_b"]):
-                        patient.state = "Ip_r" if random.random() < params["x"] else "Cp_r"
-                        patient.newly_infected = True
+    def interaction_wards(self):
+        return [None]
+
+    def handle_granular_interactions(self):
+        for ward_id in self.interaction_wards():
+            nurses = self.nurses_by_ward.get(ward_id, [])
+            ward = self.ward_contacts(ward_id, nurses)
+            if ward is None: continue
+            patients, contacts = ward
+            if self.profiler: self.profiler.touch(len(nurses) + len(patients))
+            self.update_ward_compliance(ward_id, nurses)
+
+            codes = np.array([STATE_CODES[p.state] for p in patients], dtype=np.int8)
+            for i in self.kernel.resolve(nurses, codes, contacts):
+                patients[i].state = STATE_NAMES[codes[i]]
+                patients[i].newly_infected = True
 
     def step(self):
-        for agent in self.schedule: agent.prev_state = agent.state
+        profile = self.profiler
+        if profile: profile.mark("agents", len(self.agents))
+        self.census.start_step()
         self.schedule.shuffle_do("step")
-        removed_this_step = sum(1 for a in self.schedule if isinstance(a, Patient) and a.state == "R" and a.prev_state != "R")
-        current_patients = sum(1 for a in self.schedule if isinstance(a, Patient) and a.state != "R")
+        removed_this_step = self.census.discharged_this_step()
+        current_patients = self.census.in_hospital()
         num_to_admit = min(self.params["admission_rate_per_step"], self.params["max_patient_capacity"] - current_patients) if current_patients < self.params["max_patient_capacity"] else removed_this_step
+        if profile: profile.mark("admissions", num_to_admit)
         for _ in range(num_to_admit):
             self.add_new_patient()
+        if profile: profile.mark("interactions")
         self.handle_granular_interactions()
+        if self.check_counters:
+            if profile: profile.mark("verify", len(self.agents))
+            self.census.verify(self)
+        if profile: profile.mark("collect")
         self.datacollector.collect(self)
+        if profile: profile.mark("retire", len(self.census.leaving))
+        self.retire_discharged_patients()
+        if profile: profile.stop()
 
 ####
 
@@ -99,113 +494,88 @@ class WardModel(NoWardModel):
     def __init__(self, num_nurses=150, num_wards=10, **params):
         self.num_wards = num_wards
         super().__init__(num_nurses=num_nurses, **params)
-        patients = [a for a in self.schedule if isinstance(a, Patient)]
-        nurses = [a for a in self.schedule if isinstance(a, Nurse)]
+        patients = self.census.patients_in_ward(None)
+        nurses = self.nurses_by_ward[None]
         for i, p in enumerate(patients): p.ward_id = i % self.num_wards
         nurses_per_ward = self.num_nurses // self.num_wards
         for i, n in enumerate(nurses): n.ward_id = i // nurses_per_ward if nurses_per_ward > 0 else i % self.num_wards
+        self.nurses_by_ward = self.index_nurses()
+        self.high_risk_wards = ()  # wards whose nurses get the compliance_boost
 
     def add_new_patient(self):
-        p = Patient(self, ward_id=random.randrange(self.num_wards))
+        p = Patient(self, ward_id=self.streams["admission"].randrange(self.num_wards))
         self.schedule.add(p)
+        return p
+
+    def transfer_ward(self):
+        return self.streams["transfer"].randrange(self.num_wards)
 
     def _calculate_ward_workload_factor(self, ward_id):
-        patients_in_ward = sum(1 for a in self.schedule if isinstance(a, Patient) and a.state != "R" and a.ward_id == ward_id)
-        nurses_in_ward = sum(1 for a in self.schedule if isinstance(a, Nurse) and a.ward_id == ward_id)
+        patients_in_ward = self.census.in_hospital(ward_id)
+        nurses_in_ward = len(self.nurses_by_ward.get(ward_id, []))
         return patients_in_ward / nurses_in_ward if nurses_in_ward > 0 else 0.0
 
     def calculate_workload_factor(self):
         workload_factors = [self._calculate_ward_workload_factor(i) for i in range(self.num_wards)]
         return np.mean(workload_factors) if workload_factors else 0.0
 
-    def handle_granular_interactions(self):
-        params = self.params
-        for ward_id in range(self.num_wards):
-            patients_in_ward = [a for a in self.schedule if isinstance(a, Patient) and a.state != "R" and a.ward_id == ward_id]
-            nurses_in_ward = [a for a in self.schedule if isinstance(a, Nurse) and a.ward_id == ward_id]
-            if not patients_in_ward or not nurses_in_ward: continue
-
-            workload_factor = self._calculate_ward_workload_factor(ward_id)
-            for nurse in nurses_in_ward: nurse.update_compliance(workload_factor)
-
-            random.shuffle(patients_in_ward)
-            for nurse in nurses_in_ward:
-                num_interactions = min(params["nurse_max_interactions"], len(patients_in_ward))
-                if num_interactions <= 0: continue
-                patients_to_interact = random.sample(patients_in_ward, num_interactions)
-
-                for patient in patients_to_interact:
-                    base_prob_pn = params["a"] * params["b_pn"] * (1 - params["theta"])
-                    if nurse.state == "U":
-                        if patient.state in ["Cp_s", "Ip_s"] and random.random() < base_prob_pn * (params["n"] if patient.state == "Cp_s" else 1.0) * nurse.compliance:
-                            nurse.state = "Cn_s"
-                        elif patient.state in ["Cp_r", "Ip_r"] and random.random() < base_prob_pn * (1 - params["s_b"]) * (params["n"] if patient.state == "Cp_r" else 1.0) * nurse.compliance:
-                            nurse.state = "Cn_r"
-
-                    base_prob_np = params["a"] * params["b_np"] * (1 - params["theta"])
-                    if patient.state == "S":
-                        if nurse.state == "Cn_s" and random.random() < base_prob_np:
-                            patient.state = "Ip_s" if random.random() < params["x"] else "Cp_s"
-                            patient.newly_infected = True
-                        elif nurse.state == "Cn_r" and random.random() < base_prob_np * (1 - params["s_b"]):
-                            patient.state = "Ip_r" if random.random() < params["x"] else "Cp_r"
-                            patient.newly_infected = True
+    def interaction_wards(self):
+        return range(self.num_wards)
+
+    def update_ward_compliance(self, ward_id, nurses):
+        workload_factor = self._calculate_ward_workload_factor(ward_id)
+        for nurse in nurses:
+            nurse.update_compliance(workload_factor)
+            if ward_id in self.high_risk_wards:
+                nurse.compliance += (1 - nurse.compliance) * self.params["compliance_boost"]
 
 ####
 
 class PatientAssignmentModel(WardModel):
     def __init__(self, num_nurses=150, num_wards=10, **params):
         super().__init__(num_nurses=num_nurses, num_wards=num_wards, **params)
-        self.patient_assignments = {n.unique_id: [] for n in self.schedule if isinstance(n, Nurse)}
+        self.assignments = NurseAssignments(self.nurses_by_ward)
+        self.patient_assignments = self.assignments.patients
         self._assign_initial_patients()
 
     def _assign_initial_patients(self):
         for ward_id in range(self.num_wards):
-            patients_in_ward = [p for p in self.schedule if isinstance(p, Patient) and p.ward_id == ward_id]
-            nurses_in_ward = [n for n in self.schedule if isinstance(n, Nurse) and n.ward_id == ward_id]
+            patients_in_ward = self.census.patients_in_ward(ward_id)
+            nurses_in_ward = self.nurses_by_ward.get(ward_id, [])
             if not nurses_in_ward: continue
             for i, p in enumerate(patients_in_ward):
                 nurse = nurses_in_ward[i % len(nurses_in_ward)]
-                self.patient_assignments[nurse.unique_id].append(p)
+                self.assignments.assign(p, nurse.unique_id)
 
-    def add_new_patient(self):
-        super().add_new_patient()
-        new_patient = self.schedule[-1]
-        nurses_in_ward = [n for n in self.schedule if isinstance(n, Nurse) and n.ward_id == new_patient.ward_id]
-        if not nurses_in_ward: return
-        nurse_assignments = {nid: len(p_list) for nid, p_list in self.patient_assignments.items() if nid in [n.unique_id for n in nurses_in_ward]}
-        least_burdened_id = min(nurse_assignments, key=nurse_assignments.get) if nurse_assignments else random.choice(nurses_in_ward).unique_id
-        self.patient_assignments[least_burdened_id].append(new_patient)
+    def assign_least_burdened(self, patient):
+        nurse_id = self.assignments.least_burdened(patient.ward_id)
+        if nurse_id is not None: self.assignments.assign(patient, nurse_id)
 
-    def step(self):
-        super().step()
-        for nid in self.patient_assignments: self.patient_assignments[nid] = [p for p in self.patient_assignments[nid] if p.state != 'R']
-
-    def handle_granular_interactions(self):
-        params = self.params
-        for ward_id in range(self.num_wards):
-            nurses_in_ward = [n for n in self.schedule if isinstance(n, Nurse) and n.ward_id == ward_id]
-            if not nurses_in_ward: continue
-            workload_factor = self._calculate_ward_workload_factor(ward_id)
-            for nurse in nurses_in_ward:
-                nurse.update_compliance(workload_factor)
-                assigned_patients = [p for p in self.patient_assignments.get(nurse.unique_id, []) if p.state != 'R']
-                for patient in assigned_patients:
-                    base_prob_pn = params["a"] * params["b_pn"] * (1 - params["theta"])
-                    if nurse.state == "U":
-                        if patient.state in ["Cp_s", "Ip_s"] and random.random() < base_prob_pn * (params["n"] if patient.state == "Cp_s" else 1.0) * nurse.compliance:
-                            nurse.state = "Cn_s"
-                        elif patient.state in ["Cp_r", "Ip_r"] and random.random() < base_prob_pn * (1 - params["s_b"]) * (params["n"] if patient.state == "Cp_r" else 1.0) * nurse.compliance:
-                            nurse.state = "Cn_r"
-
-                    base_prob_np = params["a"] * params["b_np"] * (1 - params["theta"])
-                    if patient.state == "S":
-                        if nurse.state == "Cn_s" and random.random() < base_prob_np:
-                            patient.state = "Ip_s" if random.random() < params["x"] else "Cp_s"
-                            patient.newly_infected = True
-                        elif nurse.state == "Cn_r" and random.random() < base_prob_np * (1 - params["s_b"]):
-                            patient.state = "Ip_r" if random.random() < params["x"] else "Cp_r"
-                            patient.newly_infected = True
+    def add_new_patient(self):
+        new_patient = super().add_new_patient()
+        self.assign_least_burdened(new_patient)
+        return new_patient
+
+    def admit_transfer(self, state):
+        p = super().admit_transfer(state)
+        self.assign_least_burdened(p)
+        return p
+
+    def transfer_out(self, patient):
+        self.assignments.unassign(patient)
+        super().transfer_out(patient)
+
+    def retire_discharged_patients(self):
+        for p in self.census.leaving: self.assignments.unassign(p)
+        super().retire_discharged_patients()
+
+    def ward_contacts(self, ward_id, nurses):
+        """Each nurse meets every active patient assigned to it."""
+        if not nurses: return None
+        assigned = [[p for p in self.patient_assignments.get(nurse.unique_id, {}) if p.state != "R"] for nurse in nurses]
+        bounds = np.cumsum([0] + [len(p_list) for p_list in assigned])
+        contacts = [np.arange(bounds[i], bounds[i + 1]) for i in range(len(nurses))]
+        return [p for p_list in assigned for p in p_list], contacts
 
 ####
 
@@ -213,64 +583,35 @@ class AdmissionWardModel(WardModel):
     def __init__(self, num_nurses=150, num_wards=10, **params):
         super().__init__(num_nurses=num_nurses, num_wards=num_wards, **params)
         self.general_wards = [i for i in range(num_wards) if i not in [self.params["admission_ward_id"], self.params["resistant_cohort_ward_id"]]]
+        self.high_risk_wards = (self.params["admission_ward_id"], self.params["resistant_cohort_ward_id"])
 
     def add_new_patient(self):
         p = Patient(self, ward_id=self.params["admission_ward_id"])
         self.schedule.add(p)
+        return p
+
+    def transfer_ward(self):
+        return self.params["admission_ward_id"]  # transfers are screened like any other admission
 
     def triage_patient(self, patient):
         if patient.state in ["Cp_r", "Ip_r"]:
             patient.ward_id = self.params["resistant_cohort_ward_id"]
         else:
-            patient.ward_id = random.choice(self.general_wards) if self.general_wards else self.params["resistant_cohort_ward_id"]
+            patient.ward_id = self.streams["admission"].choice(self.general_wards) if self.general_wards else self.params["resistant_cohort_ward_id"]
 
     def step(self):
-        patients_in_admission = [p for p in self.schedule if isinstance(p, Patient) and p.ward_id == self.params["admission_ward_id"]]
+        profile = self.profiler
+        patients_in_admission = self.census.patients_in_ward(self.params["admission_ward_id"])
+        if profile: profile.mark("triage", len(patients_in_admission))
         for p in patients_in_admission:
             if p.days_in_admission >= self.params["admission_period"]:
                 self.triage_patient(p)
         super().step()
-        for p in self.schedule:
-            if isinstance(p, Patient) and p.ward_id == self.params["admission_ward_id"]:
-                p.days_in_admission += 1
-
-    def handle_granular_interactions(self):
-        params = self.params
-        for ward_id in range(self.num_wards):
-            patients_in_ward = [a for a in self.schedule if isinstance(a, Patient) and a.state != "R" and a.ward_id == ward_id]
-            nurses_in_ward = [a for a in self.schedule if isinstance(a, Nurse) and a.ward_id == ward_id]
-            if not patients_in_ward or not nurses_in_ward: continue
-
-            workload_factor = self._calculate_ward_workload_factor(ward_id)
-            is_high_risk = (ward_id == params["admission_ward_id"] or ward_id == params["resistant_cohort_ward_id"])
-
-            for nurse in nurses_in_ward:
-                nurse.update_compliance(workload_factor)
-                if is_high_risk:
-                    nurse.compliance += (1 - nurse.compliance) * params["compliance_boost"]
-
-            random.shuffle(patients_in_ward)
-            for nurse in nurses_in_ward:
-                num_interactions = min(params["nurse_max_interactions"], len(patients_in_ward))
-                if num_interactions <= 0: continue
-                patients_to_interact = random.sample(patients_in_ward, num_interactions)
-
-                for patient in patients_to_interact:
-                    base_prob_pn = params["a"] * params["b_pn"] * (1 - params["theta"])
-                    if nurse.state == "U":
-                        if patient.state in ["Cp_s", "Ip_s"] and random.random() < base_prob_pn * (params["n"] if patient.state == "Cp_s" else 1.0) * nurse.compliance:
-                            nurse.state = "Cn_s"
-                        elif patient.state in ["Cp_r", "Ip_r"] and random.random() < base_prob_pn * (1 - params["s_b"]) * (params["n"] if patient.state == "Cp_r" else 1.0) * nurse.compliance:
-                            nurse.state = "Cn_r"
-
-                    base_prob_np = params["a"] * params["b_np"] * (1 - params["theta"])
-                    if patient.state == "S":
-                        if nurse.state == "Cn_s" and random.random() < base_prob_np:
-                            patient.state = "Ip_s" if random.random() < params["x"] else "Cp_s"
-                            patient.newly_infected = True
-                        elif nurse.state == "Cn_r" and random.random() < base_prob_np * (1 - params["s_b"]):
-                            patient.state = "Ip_r" if random.random() < params["x"] else "Cp_r"
-                            patient.newly_infected = True
+        patients_in_admission = self.census.patients_in_ward(self.params["admission_ward_id"])
+        if profile: profile.mark("admission_days", len(patients_in_admission))
+        for p in patients_in_admission:
+            p.days_in_admission += 1
+        if profile: profile.stop()
 
 ####
 
@@ -278,64 +619,34 @@ class AdmissionPatientAssignmentModel(PatientAssignmentModel):
     def __init__(self, num_nurses=150, num_wards=10, **params):
         super().__init__(num_nurses=num_nurses, num_wards=num_wards, **params)
         self.general_wards = [i for i in range(num_wards) if i not in [self.params["admission_ward_id"], self.params["resistant_cohort_ward_id"]]]
+        self.high_risk_wards = (self.params["admission_ward_id"], self.params["resistant_cohort_ward_id"])
 
     def add_new_patient(self):
         p = Patient(self, ward_id=self.params["admission_ward_id"])
         self.schedule.add(p)
-        nurses_in_admission = [n for n in self.schedule if isinstance(n, Nurse) and n.ward_id == self.params["admission_ward_id"]]
-        if not nurses_in_admission: return
-        nurse_assignments = {nid: len(p_list) for nid, p_list in self.patient_assignments.items() if nid in [n.unique_id for n in nurses_in_admission]}
-        least_burdened_id = min(nurse_assignments, key=nurse_assignments.get) if nurse_assignments else random.choice(nurses_in_admission).unique_id
-        self.patient_assignments[least_burdened_id].append(p)
+        self.assign_least_burdened(p)
+        return p
 
-    def triage_patient(self, patient):
-        current_nurse_id = next((nid for nid, p_list in self.patient_assignments.items() if patient in p_list), None)
-        if current_nurse_id: self.patient_assignments[current_nurse_id].remove(patient)
+    def transfer_ward(self):
+        return self.params["admission_ward_id"]
 
-        new_ward_id = self.params["resistant_cohort_ward_id"] if patient.state in ["Cp_r", "Ip_r"] else (random.choice(self.general_wards) if self.general_wards else self.params["resistant_cohort_ward_id"])
+    def triage_patient(self, patient):
+        self.assignments.unassign(patient)
+        new_ward_id = self.params["resistant_cohort_ward_id"] if patient.state in ["Cp_r", "Ip_r"] else (self.streams["admission"].choice(self.general_wards) if self.general_wards else self.params["resistant_cohort_ward_id"])
         patient.ward_id = new_ward_id
-
-        nurses_in_new_ward = [n for n in self.schedule if isinstance(n, Nurse) and n.ward_id == new_ward_id]
-        if not nurses_in_new_ward: return
-        nurse_assignments = {nid: len(p_list) for nid, p_list in self.patient_assignments.items() if nid in [n.unique_id for n in nurses_in_new_ward]}
-        least_burdened_id = min(nurse_assignments, key=nurse_assignments.get) if nurse_assignments else random.choice(nurses_in_new_ward).unique_id
-        self.patient_assignments[least_burdened_id].append(patient)
+        self.assign_least_burdened(patient)
 
     def step(self):
-        patients_in_admission = [p for p in self.schedule if isinstance(p, Patient) and p.ward_id == self.params["admission_ward_id"]]
+        profile = self.profiler
+        patients_in_admission = self.census.patients_in_ward(self.params["admission_ward_id"])
+        if profile: profile.mark("triage", len(patients_in_admission))
         for p in patients_in_admission:
             if p.days_in_admission >= self.params["admission_period"]:
                 self.triage_patient(p)
         super().step()
-        for p in self.schedule:
-            if isinstance(p, Patient) and p.ward_id == self.params["admission_ward_id"]:
-                p.days_in_admission += 1
+        patients_in_admission = self.census.patients_in_ward(self.params["admission_ward_id"])
+        if profile: profile.mark("admission_days", len(patients_in_admission))
+        for p in patients_in_admission:
+            p.days_in_admission += 1
+        if profile: profile.stop()
 
-    def handle_granular_interactions(self):
-        params = self.params
-        for ward_id in range(self.num_wards):
-            nurses_in_ward = [n for n in self.schedule if isinstance(n, Nurse) and n.ward_id == ward_id]
-            if not nurses_in_ward: continue
-            workload_factor = self._calculate_ward_workload_factor(ward_id)
-            is_high_risk = (ward_id == params["admission_ward_id"] or ward_id == params["resistant_cohort_ward_id"])
-            for nurse in nurses_in_ward:
-                nurse.update_compliance(workload_factor)
-                if is_high_risk:
-                    nurse.compliance += (1 - nurse.compliance) * params["compliance_boost"]
-                assigned_patients = [p for p in self.patient_assignments.get(nurse.unique_id, []) if p.state != 'R']
-                for patient in assigned_patients:
-                    base_prob_pn = params["a"] * params["b_pn"] * (1 - params["theta"])
-                    if nurse.state == "U":
-                        if patient.state in ["Cp_s", "Ip_s"] and random.random() < base_prob_pn * (params["n"] if patient.state == "Cp_s" else 1.0) * nurse.compliance:
-                            nurse.state = "Cn_s"
-                        elif patient.state in ["Cp_r", "Ip_r"] and random.random() < base_prob_pn * (1 - params["s_b"]) * (params["n"] if patient.state == "Cp_r" else 1.0) * nurse.compliance:
-                            nurse.state = "Cn_r"
-
-                    base_prob_np = params["a"] * params["b_np"] * (1 - params["theta"])
-                    if patient.state == "S":
-                        if nurse.state == "Cn_s" and random.random() < base_prob_np:
-                            patient.state = "Ip_s" if random.random() < params["x"] else "Cp_s"
-                            patient.newly_infected = True
-                        elif nurse.state == "Cn_r" and random.random() < base_prob_np * (1 - params["s_b"]):
-                            patient.state = "Ip_r" if random.random() < params["x"] else "Cp_r"
-                            patient.newly_infected = True
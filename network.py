@@ -0,0 +1,237 @@
+import bisect
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+import models
+from agents import Patient, STATE_NAMES, STATE_CODES
+from models import Census
+from parallel import iteration_seeds
+
+####
+
+# --- Network specification ---
+# A regional network is a list of hospitals and a transfer matrix:
+#   hospital:  {"name": ..., "region": ..., "model": model class (or its name in models.py), "params": PARAMS
+#              overrides and constructor arguments such as num_wards}
+#   transfers: [n x n] per-step probabilities that an active patient of hospital i is transferred to hospital j
+#              (the diagonal is ignored; each row must sum to at most 1)
+# Hospital i always gets seed i of the master seed, so results do not depend on how hospitals are sharded.
+
+COUNT_COLUMNS = ["Current_Patients", "Susceptible", "Colonized_S", "Infected_S", "Colonized_R", "Infected_R",
+                 "New_Colonized_S", "New_Infected_S", "New_Colonized_R", "New_Infected_R", "Resistance_Emergence",
+                 "Transfers_In", "Transfers_Out", "Resistant_Transfers_In"]
+RESISTANT_CODES = {STATE_CODES["Cp_r"], STATE_CODES["Ip_r"]}
+
+####
+
+class Shard:
+    """
+    The hospitals stepped by one process. Each step admits the patients transferred in during the previous step,
+    steps every model, then draws this step's transfers out from each hospital's own "transfer" stream.
+    """
+    def __init__(self, hospitals, transfers, seeds, transfer_states=None):
+        self.indices = [h["index"] for h in hospitals]
+        self.models = [h["model"](seed=seed, **h.get("params", {})) for h, seed in zip(hospitals, seeds)]
+        self.states = set(Census.ACTIVE_STATES if transfer_states is None else transfer_states)
+        self.destinations, self.cumulative = [], []
+        for row in transfers:
+            row = np.array(row, dtype=np.float64)
+            targets = np.flatnonzero(row > 0)
+            self.destinations.append(targets.tolist())
+            self.cumulative.append(np.cumsum(row[targets]).tolist())
+
+    def step(self, incoming):
+        """
+        incoming maps hospital index -> state codes of the patients transferred to it. Returns this step's row of
+        every hospital (its DataCollector columns plus transfer counts) and the outgoing transfers as
+        (source, destination, state code) tuples, in hospital and patient order.
+        """
+        rows, outgoing = [], []
+        for index, model, targets, cumulative in zip(self.indices, self.models, self.destinations, self.cumulative):
+            arrivals = incoming.get(index, [])
+            for code in arrivals: model.admit_transfer(STATE_NAMES[code])
+            model.step()
+
+            leaving = []
+            if targets:
+                stream = model.streams["transfer"]
+                for p in list(model.agents_by_type.get(Patient, ())):
+                    if p.state not in self.states: continue
+                    u = stream.random()
+                    if u < cumulative[-1]: leaving.append((p, targets[bisect.bisect_right(cumulative, u)]))
+            for p, destination in leaving:
+                outgoing.append((index, destination, STATE_CODES[p.state]))
+                model.transfer_out(p)
+
+            row = {name: values[-1] for name, values in model.datacollector.model_vars.items()}
+            row.update(Hospital=index, Step=model.steps, Transfers_In=len(arrivals), Transfers_Out=len(leaving),
+                       Resistant_Transfers_In=sum(code in RESISTANT_CODES for code in arrivals))
+            rows.append(row)
+        return rows, outgoing
+
+def _run_shard(conn, hospitals, transfers, seeds, transfer_states):
+    """Worker loop: receives each step's incoming transfers and replies with the shard's rows and outgoing transfers."""
+    try:
+        shard = Shard(hospitals, transfers, seeds, transfer_states)
+        conn.send(None)
+        while True:
+            incoming = conn.recv()
+            if incoming is None: break
+            conn.send(shard.step(incoming))
+    except Exception as error:
+        conn.send(error)
+    finally:
+        conn.close()
+
+####
+
+class HospitalNetwork:
+    """
+    Regional spread across hospitals linked by patient transfers. Hospitals are split into `shards` groups of
+    roughly equal capacity, each stepped in its own process; shards advance in lock-step and exchange the
+    transfers of each step in one batched message per shard. With shards=1 everything runs in this process.
+    transfer_states restricts which patient states can be transferred (default: every active patient).
+    """
+    def __init__(self, hospitals, transfers, master_seed=None, shards=None, transfer_states=None):
+        self.transfers = np.array(transfers, dtype=np.float64)
+        if self.transfers.shape != (len(hospitals), len(hospitals)):
+            raise ValueError(f"Transfer matrix must be {len(hospitals)} x {len(hospitals)}, got {self.transfers.shape}")
+        np.fill_diagonal(self.transfers, 0.0)
+        if (self.transfers < 0).any() or (self.transfers.sum(axis=1) > 1).any():
+            raise ValueError("Transfer probabilities must be non-negative and sum to at most 1 per hospital")
+
+        self.hospitals = []
+        for i, h in enumerate(hospitals):
+            model_class = getattr(models, h["model"]) if isinstance(h["model"], str) else h["model"]
+            self.hospitals.append({**h, "index": i, "model": model_class, "name": h.get("name", f"Hospital {i}"), "region": h.get("region")})
+        self.seeds = iteration_seeds(master_seed, len(hospitals))
+        self.transfer_states = transfer_states
+        self.shards = self.partition(min(shards or os.cpu_count(), len(hospitals)))
+
+    def partition(self, n):
+        """Splits hospital indices into n shards, largest hospitals first, each to the shard with the least capacity."""
+        shards, load = [[] for _ in range(n)], [0] * n
+        capacity = lambda h: {**models.PARAMS, **h.get("params", {})}["max_patient_capacity"]
+        for h in sorted(self.hospitals, key=capacity, reverse=True):
+            target = load.index(min(load))
+            shards[target].append(h["index"])
+            load[target] += capacity(h)
+        return [sorted(shard) for shard in shards if shard]
+
+    def _shard_args(self, indices):
+        return [self.hospitals[i] for i in indices], self.transfers[indices].tolist(), [self.seeds[i] for i in indices], self.transfer_states
+
+    def run(self, max_steps, progress=None):
+        """
+        Runs every hospital for max_steps and returns one row per hospital and step, with Hospital, Name, Region
+        and Step columns. progress, if given, is called with the number of finished steps.
+        """
+        incoming = {}
+        rows = []
+
+        def exchange(outgoing):
+            incoming.clear()
+            for _, destination, code in sorted(outgoing, key=lambda t: t[0]): incoming.setdefault(destination, []).append(code)
+
+        if len(self.shards) == 1:
+            shard = Shard(*self._shard_args(self.shards[0]))
+            for step in range(max_steps):
+                step_rows, outgoing = shard.step(incoming)
+                rows.extend(step_rows)
+                exchange(outgoing)
+                if progress: progress(step + 1)
+            return self._frame(rows)
+
+        connections, processes = [], []
+        try:
+            for indices in self.shards:
+                parent, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_run_shard, args=(child, *self._shard_args(indices)), daemon=True)
+                process.start()
+                child.close()
+                connections.append(parent)
+                processes.append(process)
+            for conn in connections: self._receive(conn)
+
+            for step in range(max_steps):
+                for conn, indices in zip(connections, self.shards):
+                    conn.send({i: incoming[i] for i in indices if i in incoming})
+                outgoing = []
+                for conn in connections:
+                    step_rows, shard_outgoing = self._receive(conn)
+                    rows.extend(step_rows)
+                    outgoing.extend(shard_outgoing)
+                exchange(outgoing)
+                if progress: progress(step + 1)
+            for conn in connections: conn.send(None)
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive(): process.terminate()
+        return self._frame(rows)
+
+    @staticmethod
+    def _receive(conn):
+        message = conn.recv()
+        if isinstance(message, Exception): raise RuntimeError("A network shard failed") from message
+        return message
+
+    def _frame(self, rows):
+        df = pd.DataFrame(rows).sort_values(["Step", "Hospital"]).reset_index(drop=True)
+        df.insert(1, "Name", [self.hospitals[i]["name"] for i in df["Hospital"]])
+        df.insert(2, "Region", [self.hospitals[i]["region"] for i in df["Hospital"]])
+        return df
+
+####
+
+# --- Aggregation ---
+
+def by_region(results):
+    """Sums hospital counts per region and step; the workload factor is averaged over the region's hospitals."""
+    counts = results.groupby(["Region", "Step"])[COUNT_COLUMNS].sum()
+    counts["Average_Nurse_Workload_Factor"] = results.groupby(["Region", "Step"])["Average_Nurse_Workload_Factor"].mean()
+    return counts.reset_index()
+
+def hospital_totals(results):
+    """Run totals per hospital: new resistant cases, transfers in and out, and resistant transfers received."""
+    totals = results.groupby(["Hospital", "Name", "Region"])[["New_Colonized_R", "New_Infected_R", "Transfers_In", "Transfers_Out", "Resistant_Transfers_In"]].sum()
+    totals.insert(0, "Cumulative_Resistant", totals.pop("New_Colonized_R") + totals.pop("New_Infected_R"))
+    return totals.reset_index()
+
+def gravity_transfers(hospitals, rate=0.002, within_region=0.8):
+    """
+    A simple transfer matrix: each active patient leaves with probability `rate` per step, to a hospital of its own
+    region with probability within_region (if there is another one), split between destinations by capacity.
+    """
+    n = len(hospitals)
+    capacity = np.array([{**models.PARAMS, **h.get("params", {})}["max_patient_capacity"] for h in hospitals], dtype=np.float64)
+    regions = [h.get("region") for h in hospitals]
+    transfers = np.zeros((n, n))
+    for i in range(n):
+        same = np.array([j != i and regions[j] == regions[i] for j in range(n)])
+        other = np.array([regions[j] != regions[i] for j in range(n)])
+        share_same = (within_region if other.any() else 1.0) if same.any() else 0.0
+        share_other = 1 - share_same if other.any() else 0.0
+        if same.any(): transfers[i, same] += rate * share_same * capacity[same] / capacity[same].sum()
+        if other.any(): transfers[i, other] += rate * share_other * capacity[other] / capacity[other].sum()
+    return transfers
+
+####
+
+# --- Example: two regions of five hospitals ---
+if __name__ == "__main__":
+    HOSPITALS = [
+        {"name": f"{region} {i}", "region": region, "model": "AdmissionWardModel" if i == 0 else "WardModel",
+         "params": {"initial_patients": 275 if i == 0 else 140, "max_patient_capacity": 400 if i == 0 else 200, "num_wards": 10 if i == 0 else 5}}
+        for region in ["North", "South"] for i in range(5)
+    ]
+    MAX_STEPS = 365
+
+    def progress(step):
+        if step % 50 == 0 or step == MAX_STEPS: print(f"  ...completed {step}/{MAX_STEPS} steps.")
+
+    network = HospitalNetwork(HOSPITALS, gravity_transfers(HOSPITALS), master_seed=2025)
+    results = network.run(MAX_STEPS, progress=progress)
+    print(hospital_totals(results))
+    print(by_region(results).groupby("Region")[["New_Colonized_R", "New_Infected_R", "Transfers_In"]].sum())
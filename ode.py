@@ -0,0 +1,188 @@
+import itertools
+import math
+import numpy as np
+import pandas as pd
+from models import PARAMS, NoWardModel, WardModel
+
+####
+
+# --- Compartments ---
+# Patients by state (counts), nurses by state (fractions of the staffed nurses), then cumulative flows used to
+# report per-step incidence like the DataCollector's New_* columns.
+COMPARTMENTS = ["S", "Cp_s", "Cp_r", "Ip_s", "Ip_r", "U", "Cn_s", "Cn_r", "S_Cp_s", "S_Ip_s", "S_Cp_r", "S_Ip_r", "Ip_s_Ip_r"]
+S, CP_S, CP_R, IP_S, IP_R, U, CN_S, CN_R, NEW_CP_S, NEW_IP_S, NEW_CP_R, NEW_IP_R, EMERGED = range(len(COMPARTMENTS))
+
+def param_grid(**axes):
+    """Every combination of the given parameter values, e.g. param_grid(target_patient_to_nurse_ratio=[4, 6, 10], theta=[0.6, 0.8])."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+####
+
+class OdeNoWardModel:
+    """
+    Mean-field compartmental counterpart of NoWardModel, driven by the same PARAMS.
+    Each entry of `scenarios` overrides PARAMS (and may set num_nurses); all scenarios are integrated
+    together with a fixed-step RK4 on a state array shaped [n_scenarios, n_compartments], and solve()
+    returns the DataCollector's columns for every scenario and step.
+    Per-step probabilities of the agent-based model are used as daily rates.
+    """
+    def __init__(self, scenarios=None, num_nurses=150, **params):
+        self.scenarios = [{**PARAMS, **params, **scenario} for scenario in (scenarios or [{}])]
+        self.params = {name: np.array([float(s[name] or 0) for s in self.scenarios]) for name in PARAMS}
+
+        nurses = []
+        for s in self.scenarios:
+            ratio = s.get("target_patient_to_nurse_ratio")
+            nurses.append(math.ceil(s["initial_patients"] / ratio) if ratio and ratio > 0 else s.get("num_nurses", num_nurses))
+        self.num_nurses = np.array(nurses, dtype=np.float64)
+        self.staffed = self.staffed_nurses()
+
+        # Rate constants, computed once per scenario
+        p = self.params
+        self.base_prob_pn = p["a"] * p["b_pn"] * (1 - p["theta"])
+        self.base_prob_np = p["a"] * p["b_np"] * (1 - p["theta"])
+        self.base_delta = (1 - p["theta"]) * p["low"] + p["theta"] * p["high"]
+        self.discharge_rate = np.stack([
+            p["mu_c"], p["mu_c"],
+            p["psi_s"] * p["iota"] + p["psi_s"] * (1 - p["iota"]),
+            p["psi_r"] * p["iota"] * (1 - p["s_p"]) + p["psi_r"] * (1 - p["iota"] * (1 - p["s_p"])),
+        ], axis=1)  # Cp_s, Cp_r, Ip_s, Ip_r
+        self.admitted_mix = np.stack([1 - p["lambda_cs"] - p["lambda_cr"] - p["lambda_is"] - p["lambda_ir"], p["lambda_cs"], p["lambda_cr"], p["lambda_is"], p["lambda_ir"]], axis=1)
+
+    def staffed_nurses(self):
+        """Nurses taking part in patient contacts."""
+        return self.num_nurses
+
+    def contacts_per_nurse(self, patients):
+        return np.minimum(self.params["nurse_max_interactions"], patients)
+
+    def workload_factor(self, patients):
+        return np.divide(patients, self.staffed, out=np.zeros_like(patients), where=self.staffed > 0)
+
+    def initial_state(self):
+        p = self.params
+        y = np.zeros((len(self.scenarios), len(COMPARTMENTS)))
+        y[:, CP_R] = p["lambda_cr"]
+        y[:, CP_S] = p["lambda_cs"]
+        y[:, IP_R] = p["lambda_ir"]
+        y[:, IP_S] = p["lambda_is"]
+        y[:, S] = 1 - y[:, [CP_S, CP_R, IP_S, IP_R]].sum(axis=1)
+        y[:, :U] *= p["initial_patients"][:, None]
+        y[:, U] = 1.0
+        return y
+
+    def derivatives(self, y):
+        p = self.params
+        dy = np.empty_like(y)
+        patients = y[:, :U].sum(axis=1)
+        safe_patients = np.maximum(patients, 1e-12)
+        compliance = np.maximum(0.0, 1.0 - self.workload_factor(patients) * p["compliance_decrease_rate"])
+        contacts = self.contacts_per_nurse(patients)
+
+        # Nurse contamination by colonised/infected patients, and hand hygiene
+        exposure = contacts * compliance * self.base_prob_pn / safe_patients * y[:, U]
+        to_cn_s = exposure * (p["n"] * y[:, CP_S] + y[:, IP_S])
+        to_cn_r = exposure * (1 - p["s_b"]) * (p["n"] * y[:, CP_R] + y[:, IP_R])
+        decontamination = self.base_delta * compliance
+        dy[:, U] = decontamination * (y[:, CN_S] + y[:, CN_R]) - to_cn_s - to_cn_r
+        dy[:, CN_S] = to_cn_s - decontamination * y[:, CN_S]
+        dy[:, CN_R] = to_cn_r - decontamination * y[:, CN_R]
+
+        # Colonisation of susceptible patients by contaminated nurses; a fraction x become infected directly
+        pressure = self.staffed * contacts / safe_patients * self.base_prob_np * y[:, S]
+        dy[:, NEW_CP_S] = (1 - p["x"]) * pressure * y[:, CN_S]
+        dy[:, NEW_IP_S] = p["x"] * pressure * y[:, CN_S]
+        dy[:, NEW_CP_R] = (1 - p["x"]) * pressure * (1 - p["s_b"]) * y[:, CN_R]
+        dy[:, NEW_IP_R] = p["x"] * pressure * (1 - p["s_b"]) * y[:, CN_R]
+        dy[:, EMERGED] = p["prob_resistance_emergence"] * y[:, IP_S]
+
+        # Progression, treatment and discharge
+        progression_s = p["kappa"] * p["m_s"] * y[:, CP_S]
+        progression_r = p["kappa"] * p["m_s"] * (1 + p["delta_m"]) * y[:, CP_R]
+        out = self.discharge_rate * y[:, CP_S:U]
+
+        # Admissions fill free beds at admission_rate_per_step and replace discharges once the hospital is full
+        rate = p["admission_rate_per_step"]
+        admissions = np.where(patients < p["max_patient_capacity"], rate, np.minimum(rate, out.sum(axis=1)))
+        dy[:, :U] = admissions[:, None] * self.admitted_mix
+        dy[:, CP_S:U] -= out
+        dy[:, S] -= dy[:, NEW_CP_S:EMERGED].sum(axis=1)
+        dy[:, CP_S] += dy[:, NEW_CP_S] - progression_s
+        dy[:, CP_R] += dy[:, NEW_CP_R] - progression_r
+        dy[:, IP_S] += dy[:, NEW_IP_S] + progression_s - dy[:, EMERGED]
+        dy[:, IP_R] += dy[:, NEW_IP_R] + progression_r + dy[:, EMERGED]
+        return dy
+
+    def integrate(self, max_steps, dt=0.25):
+        """
+        States at steps 0..max_steps, shaped [max_steps + 1, n_scenarios, n_compartments].
+        dt is rounded to a whole number of substeps per step; steps of a day can be unstable at high workloads.
+        """
+        substeps = max(1, round(1 / dt))
+        h = 1.0 / substeps
+        y = self.initial_state()
+        states = [y]
+        for _ in range(max_steps):
+            for _ in range(substeps):
+                k1 = self.derivatives(y)
+                k2 = self.derivatives(y + h / 2 * k1)
+                k3 = self.derivatives(y + h / 2 * k2)
+                k4 = self.derivatives(y + h * k3)
+                y = y + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+            states.append(y)
+        return np.stack(states)
+
+    def solve(self, max_steps, dt=0.25):
+        """
+        Expected DataCollector columns for steps 1..max_steps, one block of rows per scenario, with
+        `scenario` (index into scenarios) and `Step` columns; New_* columns are the flows over each step.
+        """
+        states = self.integrate(max_steps, dt)
+        y, new = states[1:], np.diff(states, axis=0)
+        patients = y[:, :, :U].sum(axis=2)
+        columns = {
+            "Current_Patients": patients,
+            "Susceptible": y[:, :, S],
+            "Colonized_S": y[:, :, CP_S],
+            "Infected_S": y[:, :, IP_S],
+            "Colonized_R": y[:, :, CP_R],
+            "Infected_R": y[:, :, IP_R],
+            "New_Colonized_S": new[:, :, NEW_CP_S],
+            "New_Infected_S": new[:, :, NEW_IP_S],
+            "New_Colonized_R": new[:, :, NEW_CP_R],
+            "New_Infected_R": new[:, :, NEW_IP_R],
+            "Resistance_Emergence": new[:, :, EMERGED],
+            "Average_Nurse_Workload_Factor": self.workload_factor(patients),
+        }
+        df = pd.DataFrame({name: values.T.ravel() for name, values in columns.items()})
+        df["scenario"] = np.repeat(np.arange(len(self.scenarios)), max_steps)
+        df["Step"] = np.tile(np.arange(1, max_steps + 1), len(self.scenarios))
+        return df
+
+####
+
+class OdeWardModel(OdeNoWardModel):
+    """
+    Counterpart of WardModel: patients and nurses split evenly over num_wards homogeneous wards.
+    Nurses are assigned nurses // num_wards per ward as in WardModel, so any remainder does no patient contacts,
+    and each nurse's contacts are capped by the size of its ward.
+    """
+    def __init__(self, scenarios=None, num_nurses=150, num_wards=10, **params):
+        self.num_wards = num_wards
+        super().__init__(scenarios=scenarios, num_nurses=num_nurses, **params)
+
+    def staffed_nurses(self):
+        per_ward = self.num_nurses // self.num_wards
+        return np.where(per_ward > 0, per_ward * self.num_wards, self.num_nurses)
+
+    def contacts_per_nurse(self, patients):
+        return np.minimum(self.params["nurse_max_interactions"], patients / self.num_wards)
+
+####
+
+# --- Agent-based model -> ODE counterpart ---
+ODE_MODELS = {
+    NoWardModel: OdeNoWardModel,
+    WardModel: OdeWardModel,
+}
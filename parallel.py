@@ -0,0 +1,126 @@
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+
+####
+
+# --- Seeding ---
+
+def iteration_seeds(master_seed, max_iterations):
+    """Derives one independent seed per iteration from master_seed; iteration i always gets the same seed."""
+    children = np.random.SeedSequence(master_seed).spawn(max_iterations)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+####
+
+# --- Engines ---
+# Engine modules are imported on first use, so runs on the agent engine never load them
+ENGINE_MODULES = {"array": ("array_engine", "ARRAY_MODELS"), "count": ("count_engine", "COUNT_MODELS")}
+ENGINES = ["agent"] + list(ENGINE_MODULES)
+
+def engine_class(model_class, engine):
+    """The class that runs model_class on the given engine."""
+    if engine not in ENGINES: raise ValueError(f"Unknown engine: {engine}")
+    if engine == "agent": return model_class
+    module_name, table = ENGINE_MODULES[engine]
+    engine_models = getattr(importlib.import_module(module_name), table)
+    if model_class not in engine_models: raise ValueError(f"No {engine} engine for {model_class.__name__}")
+    return engine_models[model_class]
+
+####
+
+# --- Workers ---
+# Columns that stay 0 once a model's resistance_absorbed() holds
+RESISTANT_COLUMNS = {"Colonized_R", "Infected_R", "New_Colonized_R", "New_Infected_R", "Resistance_Emergence"}
+
+def run_iteration(model_class, seed, max_steps, model_kwargs, snapshot=None, cache=None, track=None):
+    """
+    Runs one seeded model for max_steps and returns its model-level DataFrame.
+    With a snapshot the model is forked from it instead of starting cold, and the DataFrame includes the snapshot's history.
+    With a cache.ResultCache, a run computed before is read back instead (runs forked from a snapshot are not cached).
+    A model built with profile=True is always run, and its StepProfiler table is returned in the DataFrame's attrs["profile"].
+    track, a list of columns, restricts the DataFrame to them. If they are all RESISTANT_COLUMNS, the run stops as soon as
+    the model's resistance is absorbed (see NoWardModel.resistance_absorbed) and the remaining steps are filled with
+    zeros, which are their exact values, so the DataFrame has the same shape as a full run's.
+    """
+    cacheable = cache is not None and snapshot is None and not model_kwargs.get("profile")
+    cache_kwargs = model_kwargs
+    key = cache.key(model_class, seed, max_steps, cache_kwargs) if cacheable else None
+    if key is not None:
+        df = cache.get(key)
+        if df is not None: return df if track is None else df[list(track)]
+        if track is not None:
+            # A tracked run is cached on its own, as it may have stopped early
+            cache_kwargs = {**model_kwargs, "track": sorted(track)}
+            key = cache.key(model_class, seed, max_steps, cache_kwargs)
+            df = cache.get(key)
+            if df is not None: return df[list(track)]
+
+    model = snapshot.fork(model_class, seed=seed, **model_kwargs) if snapshot is not None else model_class(seed=seed, **model_kwargs)
+    stop_early = track is not None and set(track) <= RESISTANT_COLUMNS and hasattr(model, "resistance_absorbed")
+    steps = 0
+    while steps < max_steps:
+        model.step()
+        steps += 1
+        if stop_early and model.resistance_absorbed(): break
+    df = model.datacollector.get_model_vars_dataframe()
+    if track is not None:
+        df = df[list(track)]
+        if steps < max_steps:
+            df = pd.concat([df, pd.DataFrame(0, index=range(len(df), len(df) + max_steps - steps), columns=df.columns)])
+    if getattr(model, "profiler", None) is not None: df.attrs["profile"] = model.profiler.to_frame()
+    if key is not None: cache.put(key, df, cache.describe(model_class, seed, max_steps, cache_kwargs))
+    return df
+
+def iter_batch(model_class, max_iterations, max_steps, master_seed=None, workers=None, iterations=None, snapshot=None, cache=None, stop=None, track=None, **model_kwargs):
+    """
+    Runs seeded replicates of model_class across a process pool and yields (iteration, DataFrame) as each one
+    finishes, so callers can stream results out instead of holding the whole batch in memory.
+    iterations restricts the run to a subset of range(max_iterations), e.g. the ones missing from an interrupted
+    batch; each iteration keeps the seed it would have had in the full batch.
+    snapshot, a snapshot.Snapshot, starts every iteration from the same burn-in state; cache, a cache.ResultCache,
+    reuses iterations already computed with the same model, params, seed and code.
+    Iterations are launched in order, at most one per worker ahead; once stop() returns True no more are launched,
+    and those already running are still yielded.
+    track restricts each DataFrame to a list of columns, and lets runs stop early (see run_iteration).
+    """
+    seeds = iteration_seeds(master_seed, max_iterations)
+    iterations = range(max_iterations) if iterations is None else list(iterations)
+    workers = workers or os.cpu_count()
+
+    if workers == 1 or len(iterations) <= 1:
+        for it in iterations:
+            if stop is not None and stop(): return
+            yield it, run_iteration(model_class, seeds[it], max_steps, model_kwargs, snapshot, cache, track)
+        return
+
+    queue = iter(iterations)
+    with ProcessPoolExecutor(max_workers=min(workers, len(iterations))) as pool:
+        running = {}
+
+        def launch():
+            while len(running) < workers and not (stop is not None and stop()):
+                it = next(queue, None)
+                if it is None: return
+                running[pool.submit(run_iteration, model_class, seeds[it], max_steps, model_kwargs, snapshot, cache, track)] = it
+
+        launch()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield running.pop(future), future.result()
+            launch()
+
+def run_batch(model_class, max_iterations, max_steps, master_seed=None, workers=None, progress=None, cache=None, **model_kwargs):
+    """
+    Runs max_iterations seeded replicates of model_class across a process pool.
+    Results are returned in iteration order, so they depend only on master_seed and never on the number of workers.
+    progress, if given, is called with the number of finished iterations.
+    """
+    results = [None] * max_iterations
+    for done, (it, df) in enumerate(iter_batch(model_class, max_iterations, max_steps, master_seed=master_seed, workers=workers, cache=cache, **model_kwargs), 1):
+        results[it] = df
+        if progress: progress(done)
+    return results
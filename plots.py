@@ -1,47 +1,96 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import statsmodels.api as sm
+from models import PARAMS
+from results import ResultStore, StepAggregator
+
+####
+
+# --- Load results ---
+
+def load_aggregates(models_to_run):
+    """
+    Per-step statistics of each model, from the aggregate batch_run.py saves in each result store (rebuilt from the
+    chunks if stale). models_to_run is a list like batch_run.MODELS_TO_RUN, with "title" and "store" keys.
+    """
+    return {m["title"]: StepAggregator.from_store(m["store"]) for m in models_to_run}
+
+def staff_ratio(store_path):
+    """The target patient-to-nurse ratio a result store was run with (its params over PARAMS); 0 means fixed staffing."""
+    settings = ResultStore(store_path).manifest["settings"] or {}
+    return {**PARAMS, **settings.get("params", {})}["target_patient_to_nurse_ratio"]
+
+def ratio_label(ratio):
+    return f", staff ratio 1:{ratio}" if ratio else ""
+
+def missing_columns(aggregates, columns):
+    """The columns (or running totals) among `columns` that some model's aggregate does not have."""
+    return sorted({c for aggregator in aggregates.values() for c in columns if c not in (aggregator.names or [])})
+
+def finish(path):
+    """Saves the current figure to path and closes it, or shows it if path is None."""
+    if path is None:
+        plt.show()
+    else:
+        plt.savefig(path)
+        plt.close()
+
 ####
 
 # --- Plot 1 ---
+INCIDENCE_COLUMNS = ["Susceptible", "New_Colonized_R", "New_Infected_R"]
 
-plt.figure(figsize=(12, 7))
-for name, df_mean in all_means.items():
-    # --- Calculate the raw proportion ---
-    # Replace 0s in the denominator with NaN to avoid division errors, then fill resulting NaNs
-    denominator = df_mean['Susceptible'].replace(0, np.nan)
-    proportion = (df_mean['New_Colonized_R'] + df_mean['New_Infected_R']) / denominator
-    proportion = proportion.fillna(0)
-
-    # --- Apply LOESS smoothing ---
-    smoothed = sm.nonparametric.lowess(proportion, df_mean.index, frac=0.022)
-
-    # --- Plot the smoothed curve ---
-    plt.plot(smoothed[:, 0], smoothed[:, 1], label=name, linewidth=2)
-
-plt.xlabel("Time Steps", fontsize=16)
-plt.ylabel("Proportion of new resistant cases, staff ratio 1:10", fontsize=16)
-#plt.title("Incidence Rate of New Resistant Cases (LOESS Smoothed)", fontsize=18)
-plt.legend(fontsize = 10)
-plt.grid(False)
-# plt.savefig("comparative_proportion_new_cases_smoothed.png")
-plt.show()
-# plt.close()
+def plot_incidence(aggregates, path=None, ratio=None):
+    plt.figure(figsize=(12, 7))
+    for name, aggregator in aggregates.items():
+        df_mean = aggregator.mean()
+        # --- Calculate the raw proportion ---
+        # Replace 0s in the denominator with NaN to avoid division errors, then fill resulting NaNs
+        denominator = df_mean['Susceptible'].replace(0, np.nan)
+        proportion = (df_mean['New_Colonized_R'] + df_mean['New_Infected_R']) / denominator
+        proportion = proportion.fillna(0)
+
+        # --- Apply LOESS smoothing ---
+        smoothed = sm.nonparametric.lowess(proportion, df_mean.index, frac=0.022)
+
+        # --- Plot the smoothed curve ---
+        plt.plot(smoothed[:, 0], smoothed[:, 1], label=name, linewidth=2)
+
+    plt.xlabel("Time Steps", fontsize=16)
+    plt.ylabel("Proportion of new resistant cases" + ratio_label(ratio), fontsize=16)
+    #plt.title("Incidence Rate of New Resistant Cases (LOESS Smoothed)", fontsize=18)
+    plt.legend(fontsize = 10)
+    plt.grid(False)
+    finish(path)  # e.g. "comparative_proportion_new_cases_smoothed.png"
 
 ####
 
 # --- Plot 2 ---
+CUMULATIVE_COLUMNS = ["Cumulative_Resistant"]
+
+def plot_cumulative(aggregates, path=None, ratio=None):
+    plt.figure(figsize=(12, 7))
+    for name, aggregator in aggregates.items():
+        # --- Cumulative resistant cases with the 95% confidence band of their mean ---
+        band = aggregator.band('Cumulative_Resistant')
+
+        # --- Plot curve ---
+        plt.plot(band.index, band['Mean'], label=name, linewidth=2)
+        plt.fill_between(band.index, band['Low'], band['High'], alpha=0.2)
+
+    plt.xlabel("Time Steps", fontsize=16)
+    plt.ylabel("Cumulative number of resistant cases" + ratio_label(ratio), fontsize=16)
+    # plt.title("Cumulative Resistant Cases: Comparison of Models (Averaged)", fontsize=18)
+    plt.legend(fontsize=10)
+    plt.grid(False)
+    finish(path)  # e.g. "comparative_cumulative_resistant_cases.png"
+
+####
 
-plt.figure(figsize=(12, 7))
-for name, df_mean in all_means.items():
-    # --- Calculate cumulative resistant cases ---
-    cumulative_resistant = (df_mean['New_Colonized_R'] + df_mean['New_Infected_R']).cumsum()
-
-    # --- Plot curve ---
-    plt.plot(df_mean.index, cumulative_resistant, label=name, linewidth=2)
-
-plt.xlabel("Time Steps", fontsize=16)
-plt.ylabel("Cumulative number of resistant cases, staff ratio 1:10", fontsize=16)
-# plt.title("Cumulative Resistant Cases: Comparison of Models (Averaged)", fontsize=18)
-plt.legend(fontsize=10)
-plt.grid(False)
-# plt.savefig("comparative_cumulative_resistant_cases.png")
-plt.show()
-# plt.close()
+if __name__ == "__main__":
+    from batch_run import MODELS_TO_RUN
+    aggregates = load_aggregates(MODELS_TO_RUN)
+    ratios = {staff_ratio(m["store"]) for m in MODELS_TO_RUN}
+    ratio = ratios.pop() if len(ratios) == 1 else None
+    plot_incidence(aggregates, ratio=ratio)
+    plot_cumulative(aggregates, ratio=ratio)
@@ -0,0 +1,338 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+####
+
+class ResultStore:
+    """
+    Columnar on-disk store for one batch run: one uncompressed .npz chunk per finished iteration plus a
+    manifest.json recording the run settings, the column dtypes and which iterations are complete.
+    Chunks and the manifest are written atomically (write then rename), so an interrupted batch leaves a
+    consistent store and can resume from the iterations that are missing.
+    Columns are read lazily: only the requested arrays of each chunk are loaded.
+    """
+    MANIFEST = "manifest.json"
+
+    def __init__(self, path):
+        self.path = path
+        manifest_path = os.path.join(path, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f: self.manifest = json.load(f)
+        else:
+            self.manifest = {"settings": None, "columns": None, "completed": []}
+
+    # --- Writing ---
+
+    def open(self, **settings):
+        """
+        Prepares the store for a run with the given settings (model, steps, seed...). Settings are stored
+        in the manifest on first use; a store holding iterations of a different run raises ValueError.
+        """
+        settings = json.loads(json.dumps(settings, default=str))
+        if self.manifest["completed"] and self.manifest["settings"] != settings:
+            raise ValueError(f"{self.path} holds results of a different run: {self.manifest['settings']}")
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest["settings"] = settings
+        self._write_manifest()
+        return self
+
+    def append(self, iteration, df):
+        """Writes one iteration's model DataFrame (one row per step) as typed columns and marks it complete."""
+        columns = {}
+        for name in df.columns:
+            values = df[name].to_numpy()
+            columns[name] = values.astype(np.int32) if values.dtype.kind in "iub" else values.astype(np.float64)
+        if self.manifest["columns"] is None:
+            self.manifest["columns"] = {name: values.dtype.str for name, values in columns.items()}
+
+        chunk = self._chunk_path(iteration)
+        with open(chunk + ".tmp", "wb") as f: np.savez(f, **columns)
+        os.replace(chunk + ".tmp", chunk)
+
+        if iteration not in self.manifest["completed"]:
+            self.manifest["completed"] = sorted(self.manifest["completed"] + [iteration])
+        self._write_manifest()
+
+    # --- Reading ---
+
+    @property
+    def columns(self):
+        return list(self.manifest["columns"] or {})
+
+    def completed(self):
+        return list(self.manifest["completed"])
+
+    def read(self, iteration, columns=None):
+        """{column: array} of one completed iteration, loading only `columns`."""
+        columns = self.columns if columns is None else list(columns)
+        with np.load(self._chunk_path(iteration)) as chunk:
+            return {name: chunk[name] for name in columns}
+
+    def iter_chunks(self, columns=None):
+        """Yields (iteration, {column: array}) for each completed iteration, loading only `columns`."""
+        for it in self.completed():
+            yield it, self.read(it, columns)
+
+    def load(self, columns=None):
+        """Raw results as one DataFrame with iteration and Step columns, like the CSV run_simulation used to write."""
+        frames = []
+        for it, arrays in self.iter_chunks(columns):
+            df = pd.DataFrame(arrays)
+            df["iteration"] = it
+            df["Step"] = np.arange(1, len(df) + 1)
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(columns or self.columns) + ["iteration", "Step"])
+
+    def mean_by_step(self, columns=None):
+        """Mean of each column per step across iterations, accumulated one chunk at a time."""
+        columns = self.columns if columns is None else list(columns)
+        total, n = None, 0
+        for _, arrays in self.iter_chunks(columns):
+            block = np.column_stack([arrays[name].astype(np.float64) for name in columns])
+            total = block if total is None else total + block
+            n += 1
+        if total is None: return pd.DataFrame(columns=columns)
+        return pd.DataFrame(total / n, columns=columns, index=pd.RangeIndex(1, len(total) + 1, name="Step"))
+
+    def to_csv(self, csv_path):
+        self.load().to_csv(csv_path, index=False)
+
+    # --- Internals ---
+
+    def _chunk_path(self, iteration):
+        return os.path.join(self.path, f"iteration_{iteration:05d}.npz")
+
+    def _write_manifest(self):
+        manifest_path = os.path.join(self.path, self.MANIFEST)
+        with open(manifest_path + ".tmp", "w") as f: json.dump(self.manifest, f, indent=1)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+####
+
+# --- Run summaries ---
+
+def summarize(df, outputs):
+    """Reduces one run's DataFrame to named outputs: name -> (column or list of columns, "sum" | "mean" | "last" | "max")."""
+    summary = {}
+    for name, (columns, how) in outputs.items():
+        series = df[columns].sum(axis=1) if isinstance(columns, list) else df[columns]
+        summary[name] = float({"sum": series.sum, "mean": series.mean, "last": lambda: series.iloc[-1], "max": series.max}[how]())
+    return summary
+
+class RunningStats:
+    """Welford's running mean and variance, elementwise over values of a fixed shape (scalars or per-step curves)."""
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self.m2 = None
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self.mean is None: self.mean, self.m2 = np.zeros_like(x), np.zeros_like(x)
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else np.full_like(self.mean, np.nan)
+
+    def half_width(self, confidence=0.95):
+        """Half-width of the t confidence interval of the mean."""
+        from scipy import stats  # imported here so writing and reading stores does not load SciPy
+        if self.n < 2: return np.full_like(self.mean, np.inf)
+        return stats.t.ppf((1 + confidence) / 2, self.n - 1) * np.sqrt(self.variance() / self.n)
+
+class ConvergenceMonitor:
+    """
+    Precision target for adaptive batches. Tracks RunningStats of summary outputs (see summarize) and of per-step
+    curves of chosen columns, and reports convergence once at least min_iterations runs are in and every confidence
+    interval half-width is at most `target`: relative to |mean| for outputs and to the curve's mean level for
+    per-step columns when relative=True, in the outputs' own units otherwise.
+    """
+    DEFAULTS = {
+        "outputs": {"Cumulative_Resistant": (["New_Colonized_R", "New_Infected_R"], "sum")},
+        "per_step": [],
+        "target": 0.05,
+        "relative": True,
+        "confidence": 0.95,
+        "min_iterations": 10,
+    }
+
+    def __init__(self, precision=None):
+        self.precision = {**self.DEFAULTS, **(precision or {})}
+        self.stats = {}
+
+    @property
+    def n(self):
+        return min((s.n for s in self.stats.values()), default=0)
+
+    def update(self, df):
+        values = summarize(df, self.precision["outputs"])
+        values.update({"Step " + column: df[column].to_numpy() for column in self.precision["per_step"]})
+        for name, value in values.items(): self.stats.setdefault(name, RunningStats()).update(value)
+
+    def half_widths(self):
+        """Worst (largest) half-width of each tracked quantity, relative if the target is."""
+        widths = {}
+        for name, s in self.stats.items():
+            width = s.half_width(self.precision["confidence"])
+            if self.precision["relative"]:
+                scale = np.abs(s.mean).mean() if np.ndim(s.mean) else abs(s.mean)
+                width = width / scale if scale > 0 else np.where(width > 0, np.inf, 0.0)
+            widths[name] = float(np.max(width))
+        return widths
+
+    def converged(self):
+        if self.n < self.precision["min_iterations"]: return False
+        return all(width <= self.precision["target"] for width in self.half_widths().values())
+
+####
+
+# --- Per-step aggregation ---
+
+class StepAggregator:
+    """
+    Streaming per-step statistics across iterations, in O(steps x columns) memory whatever the number of iterations:
+    Welford mean and variance of every column, and a P-square sketch (Jain & Chlamtac) of each of `quantiles`.
+    `cumulative` adds running totals (name -> list of columns summed, then accumulated over steps) computed per
+    iteration, so bands of cumulative curves are those of the iterations' totals and not sums of per-step bands.
+    """
+    DEFAULTS = {
+        "quantiles": (0.05, 0.5, 0.95),
+        "cumulative": {"Cumulative_Resistant": ["New_Colonized_R", "New_Infected_R"]},
+    }
+    FILE = "aggregate.npz"
+
+    def __init__(self, columns=None, quantiles=None, cumulative=None):
+        self.columns = None if columns is None else list(columns)
+        self.quantiles = np.array(self.DEFAULTS["quantiles"] if quantiles is None else quantiles, dtype=np.float64)
+        self.cumulative = dict(self.DEFAULTS["cumulative"] if cumulative is None else cumulative)
+        self.names = None  # columns followed by cumulative totals
+        self.iterations = []
+        self.stats = RunningStats()
+        self.first = []  # the first five observations, which seed the P-square markers
+        self.heights = None  # marker heights, shaped [quantiles, steps, names, 5]
+        self.positions = None  # actual marker positions, same shape
+        self.desired = None  # desired marker positions, [quantiles, 5]
+
+    @property
+    def n(self):
+        return self.stats.n
+
+    def update(self, df, iteration=None):
+        """Adds one iteration, given as its model DataFrame or {column: array}."""
+        if self.columns is None:
+            self.columns = [name for name in df if name not in self.cumulative and np.asarray(df[name]).dtype.kind in "iufb"]
+        if self.names is None:
+            # Running totals of columns the runs do not report (e.g. runs tracking a subset of columns) are skipped
+            self.names = self.columns + [name for name, columns in self.cumulative.items() if name not in self.columns and all(c in df for c in columns)]
+        values = np.column_stack(
+            [np.asarray(df[name], dtype=np.float64) for name in self.columns]
+            + [np.cumsum(np.sum([np.asarray(df[c], dtype=np.float64) for c in self.cumulative[name]], axis=0)) for name in self.names[len(self.columns):]]
+        )
+        if self.stats.mean is not None and values.shape != self.stats.mean.shape:
+            raise ValueError(f"Iteration has {values.shape[0]} steps, expected {self.stats.mean.shape[0]}")
+        self.stats.update(values)
+        self._update_sketch(values)
+        if iteration is not None: self.iterations.append(int(iteration))
+
+    def _update_sketch(self, x):
+        if self.heights is None:
+            self.first.append(x)
+            if len(self.first) == 5:
+                self.heights = np.broadcast_to(np.sort(np.stack(self.first, axis=-1), axis=-1), (len(self.quantiles),) + x.shape + (5,)).copy()
+                self.positions = np.broadcast_to(np.arange(5.0), self.heights.shape).copy()
+                p = self.quantiles[:, None]
+                self.desired = np.hstack([0 * p, 2 * p, 4 * p, 2 + 2 * p, 4 + 0 * p])
+                self.first = []
+            return
+
+        q, pos = self.heights, self.positions
+        q[..., 0] = np.minimum(q[..., 0], x)
+        q[..., 4] = np.maximum(q[..., 4], x)
+        cell = (x[..., None] >= q[..., 1:4]).sum(axis=-1)  # the marker interval x falls in
+        pos += np.arange(5) > cell[..., None]
+        p = self.quantiles[:, None]
+        self.desired += np.hstack([0 * p, p / 2, p, (1 + p) / 2, 1 + 0 * p])
+        desired = self.desired[:, None, None, :]
+
+        for i in (1, 2, 3):
+            d = desired[..., i] - pos[..., i]
+            move = ((d >= 1) & (pos[..., i + 1] - pos[..., i] > 1)) | ((d <= -1) & (pos[..., i - 1] - pos[..., i] < -1))
+            if not move.any(): continue
+            s = np.sign(d)
+            below, here, above = q[..., i - 1], q[..., i], q[..., i + 1]
+            n_below, n_here, n_above = pos[..., i - 1], pos[..., i], pos[..., i + 1]
+            parabolic = here + s / (n_above - n_below) * (
+                (n_here - n_below + s) * (above - here) / (n_above - n_here)
+                + (n_above - n_here - s) * (here - below) / (n_here - n_below))
+            neighbour = np.where(s > 0, above, below)
+            linear = here + s * (neighbour - here) / (np.where(s > 0, n_above, n_below) - n_here)
+            new = np.where((below < parabolic) & (parabolic < above), parabolic, linear)
+            q[..., i] = np.where(move, new, here)
+            pos[..., i] += np.where(move, s, 0)
+
+    # --- Results ---
+
+    def _frame(self, values, names=None):
+        return pd.DataFrame(values, columns=names or self.names, index=pd.RangeIndex(1, len(values) + 1, name="Step"))
+
+    def mean(self):
+        return self._frame(self.stats.mean) if self.n else pd.DataFrame(columns=self.names or [])
+
+    def std(self):
+        return self._frame(np.sqrt(self.stats.variance()))
+
+    def quantile(self, q):
+        """Per-step estimate of quantile q (one of `quantiles`); exact while fewer than five iterations are in."""
+        if self.heights is None:
+            return self._frame(np.quantile(np.stack(self.first), q, axis=0))
+        index = np.flatnonzero(np.isclose(self.quantiles, q))
+        if not len(index): raise KeyError(f"Quantile {q} is not tracked; tracked: {list(self.quantiles)}")
+        return self._frame(self.heights[index[0], ..., 2])
+
+    def band(self, column, confidence=0.95):
+        """Mean of `column` per step with the t confidence interval of the mean, as Mean, Low and High columns."""
+        j = self.names.index(column)
+        mean, half_width = self.stats.mean[:, j], self.stats.half_width(confidence)[:, j]
+        return self._frame(np.column_stack([mean, mean - half_width, mean + half_width]), ["Mean", "Low", "High"])
+
+    # --- Persistence ---
+
+    def save(self, path):
+        """Writes the aggregator's state (a few arrays of steps x columns) as one .npz, atomically."""
+        meta = {"columns": self.columns, "names": self.names, "cumulative": self.cumulative, "iterations": self.iterations, "n": self.n}
+        arrays = {"quantiles": self.quantiles, "mean": self.stats.mean, "m2": self.stats.m2}
+        if self.heights is not None: arrays.update(heights=self.heights, positions=self.positions, desired=self.desired)
+        elif self.first: arrays["first"] = np.stack(self.first)
+        with open(path + ".tmp", "wb") as f: np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            aggregator = cls(meta["columns"], data["quantiles"], meta["cumulative"])
+            aggregator.names, aggregator.iterations = meta["names"], meta["iterations"]
+            aggregator.stats.n, aggregator.stats.mean, aggregator.stats.m2 = meta["n"], data["mean"], data["m2"]
+            if "heights" in data: aggregator.heights, aggregator.positions, aggregator.desired = data["heights"], data["positions"], data["desired"]
+            elif "first" in data: aggregator.first = list(data["first"])
+        return aggregator
+
+    @classmethod
+    def from_store(cls, path, **kwargs):
+        """
+        The aggregate saved in a ResultStore directory by run_simulation, if it covers every completed iteration,
+        otherwise one rebuilt by streaming the store's chunks in iteration order.
+        """
+        store = ResultStore(path)
+        saved = os.path.join(path, cls.FILE)
+        if os.path.exists(saved) and not kwargs:
+            aggregator = cls.load(saved)
+            if sorted(aggregator.iterations) == store.completed(): return aggregator
+        aggregator = cls(**kwargs)
+        for it, arrays in store.iter_chunks(): aggregator.update(arrays, iteration=it)
+        return aggregator
@@ -0,0 +1,155 @@
+import json
+import numpy as np
+import models
+from agents import Patient, Nurse, STATE_NAMES, STATE_CODES
+from models import WardModel, PatientAssignmentModel
+
+####
+
+# --- Nurse states, in the order of their integer codes ---
+NURSE_STATES = ["U", "Cn_s", "Cn_r"]
+NOT_IN_WARD = -1  # ward_id None in the int16 ward column
+
+####
+
+class Snapshot:
+    """
+    Full state of an agent-based model between two steps: patients, nurses, ward placement, nurse-patient
+    assignments, every random stream and the DataCollector history.
+    Snapshots are saved as one compressed .npz (typed arrays plus a JSON header) and can be forked into any
+    of the models in models.py, with changed params, so one burn-in run can seed many scenario runs.
+    """
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+
+    @property
+    def steps(self):
+        return self.meta["steps"]
+
+    @classmethod
+    def take(cls, model):
+        """Captures model; call it between steps, once discharged patients have been retired."""
+        patients = list(model.agents_by_type.get(Patient, ()))
+        nurses = list(model.agents_by_type.get(Nurse, ()))
+        patient_index = {p: i for i, p in enumerate(patients)}
+        nurse_index = {n: j for j, n in enumerate(nurses)}
+
+        arrays = {
+            # Schedule order, patients as their index and nurses as -(index + 1), so shuffles replay exactly
+            "agent_order": np.array([patient_index[a] if a in patient_index else -(nurse_index[a] + 1) for a in model.agents], dtype=np.int32),
+            "patient_state": np.array([STATE_CODES[p.state] for p in patients], dtype=np.int8),
+            "patient_prev_state": np.array([STATE_CODES[p.prev_state] for p in patients], dtype=np.int8),
+            "patient_ward": np.array([NOT_IN_WARD if p.ward_id is None else p.ward_id for p in patients], dtype=np.int16),
+            "patient_days_in_admission": np.array([p.days_in_admission for p in patients], dtype=np.int32),
+            "patient_newly_infected": np.array([p.newly_infected for p in patients], dtype=bool),
+            "patient_random": np.array([p.progression_random.getstate()[1] for p in patients], dtype=np.uint32).reshape(len(patients), -1),
+            "ward_member_order": np.array([patient_index[p] for ward in model.census.members.values() for p in ward], dtype=np.int32),
+            "nurse_state": np.array([NURSE_STATES.index(n.state) for n in nurses], dtype=np.int8),
+            "nurse_ward": np.array([NOT_IN_WARD if n.ward_id is None else n.ward_id for n in nurses], dtype=np.int16),
+            "nurse_compliance": np.array([n.compliance for n in nurses], dtype=np.float64),
+            "nurse_has_contacted": np.array([n.has_contacted for n in nurses], dtype=bool),
+        }
+        if isinstance(model, PatientAssignmentModel):
+            # (nurse, patient) pairs in each nurse's assignment order
+            pairs = [(nurse_index[n], patient_index[p]) for n in nurses for p in model.assignments.patients[n.unique_id]]
+            arrays["assignments"] = np.array(pairs, dtype=np.int32).reshape(-1, 2)
+        for name, values in model.datacollector.model_vars.items():
+            arrays["collected/" + name] = np.asarray(values)
+
+        meta = {
+            "model": type(model).__name__,
+            "params": model.params,
+            "num_wards": getattr(model, "num_wards", None),
+            "num_nurses": len(nurses),
+            "steps": model.steps,
+            "running": model.running,
+            "stream_seed": model.stream_seed,
+            "admitted": model.admitted,
+            "discharged": model.discharged,
+            "random": model.random.getstate()[1],
+            "streams": {name: stream.getstate()[1] for name, stream in model.streams.items()},
+            "rng": model.rng.bit_generator.state,
+        }
+        return cls(meta, arrays)
+
+    # --- Files ---
+
+    def save(self, path):
+        np.savez_compressed(path, meta=np.array(json.dumps(self.meta)), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(json.loads(str(data["meta"])), {name: data[name] for name in data.files if name != "meta"})
+
+    # --- Forking ---
+
+    def fork(self, model_class=None, seed=None, **kwargs):
+        """
+        Builds a model_class (by default the class the snapshot was taken from) in the snapshot's state.
+        kwargs are passed to the constructor, so params can be changed for the scenario being run.
+        With seed=None the fork continues the snapshot's random streams, and the same class with the same
+        params replays the original run exactly; a seed gives the fork its own streams, so forks with
+        different seeds are independent replicates from the same starting hospital.
+        Ward placement, assignments and nurse states are kept whenever the target has the same wards and
+        nurses; otherwise patients are spread over the target's wards as at start-up and nurses start clean.
+        """
+        meta, arrays = self.meta, self.arrays
+        model_class = model_class or getattr(models, meta["model"])
+        exact = seed is None
+        kwargs = {**meta["params"], **kwargs}
+        kwargs.setdefault("num_nurses", meta["num_nurses"])
+        if issubclass(model_class, WardModel) and meta["num_wards"] is not None: kwargs.setdefault("num_wards", meta["num_wards"])
+        model = model_class(seed=meta["stream_seed"] if exact else seed, **kwargs)
+
+        # Replace the freshly admitted population with the snapshot's
+        for p in list(model.agents_by_type.get(Patient, ())):
+            if isinstance(model, PatientAssignmentModel): model.assignments.unassign(p)
+            p.remove()
+
+        num_wards = getattr(model, "num_wards", None)
+        same_wards = num_wards == meta["num_wards"]
+        patients = []
+        for i, code in enumerate(arrays["patient_state"]):
+            ward_id = int(arrays["patient_ward"][i]) if same_wards and num_wards is not None else (i % num_wards if num_wards else None)
+            p = Patient(model, ward_id=ward_id, state=STATE_NAMES[code])
+            model.schedule.add(p)
+            p.prev_state = STATE_NAMES[arrays["patient_prev_state"][i]]
+            p.newly_infected = bool(arrays["patient_newly_infected"][i])
+            p.days_in_admission = int(arrays["patient_days_in_admission"][i])
+            if exact: p.progression_random.setstate((3, tuple(int(x) for x in arrays["patient_random"][i]), None))
+            patients.append(p)
+        if same_wards: model.census.reorder([patients[i] for i in arrays["ward_member_order"]])
+
+        nurses = list(model.agents_by_type.get(Nurse, ()))
+        same_staff = same_wards and len(nurses) == meta["num_nurses"]
+        if same_staff:
+            for j, n in enumerate(nurses):
+                n.state = NURSE_STATES[arrays["nurse_state"][j]]
+                n.compliance = float(arrays["nurse_compliance"][j])
+                n.has_contacted = bool(arrays["nurse_has_contacted"][j])
+            # Re-register agents in the snapshot's schedule order
+            for k in arrays["agent_order"]:
+                agent = patients[k] if k >= 0 else nurses[-k - 1]
+                model.deregister_agent(agent)
+                model.register_agent(agent)
+
+        if isinstance(model, PatientAssignmentModel):
+            if same_staff and "assignments" in arrays:
+                for j, i in arrays["assignments"]: model.assignments.assign(patients[i], nurses[j].unique_id)
+            else:
+                model._assign_initial_patients()
+
+        model.steps = meta["steps"]
+        model.running = meta["running"]
+        model.discharged = dict(meta["discharged"])
+        for name, values in model.datacollector.model_vars.items():
+            values[:] = arrays.get("collected/" + name, np.empty(0)).tolist()
+
+        if exact:
+            model.admitted = meta["admitted"]
+            model.random.setstate((3, tuple(meta["random"]), None))
+            for name, state in meta["streams"].items(): model.streams[name].setstate((3, tuple(state), None))
+            model.rng.bit_generator.state = meta["rng"]
+        return model
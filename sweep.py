@@ -0,0 +1,251 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+import models
+from models import PARAMS
+from parallel import engine_class, iteration_seeds, run_iteration
+from results import summarize
+
+####
+
+# --- Sweep specification ---
+# A sweep is a dict:
+#   "models":     model classes (or their names in models.py) to run every design point on
+#   "design":     "grid", "lhs" or "sobol"
+#   "params":     for "grid", PARAMS key -> list of values; for "lhs"/"sobol", PARAMS key -> (low, high),
+#                 where int bounds give int values
+#   "samples":    number of points for "lhs", base sample size N for "sobol" (N * (d + 2) points)
+#   "fixed":      PARAMS overrides shared by every point (optional)
+#   "replicates", "max_steps", "master_seed", "engine" ("agent", "array" or "count")
+#   "outputs":    output name -> (column or list of columns, "sum" | "mean" | "last" | "max"), computed per run
+# Replicate r of every point and model uses the same seed, so comparisons between points and models are paired.
+
+DEFAULT_OUTPUTS = {
+    "Cumulative_New_Infected_R": ("New_Infected_R", "sum"),
+    "Cumulative_Resistant": (["New_Colonized_R", "New_Infected_R"], "sum"),
+}
+def design_points(spec):
+    """Parameter sets of the spec's design, each a dict with "point", "block" (Sobol matrix it belongs to) and "params"."""
+    design, ranges = spec.get("design", "grid"), spec["params"]
+    names = list(ranges)
+    fixed = spec.get("fixed", {})
+    for name in names:
+        if name not in PARAMS: raise KeyError(f"Unknown parameter: {name}")
+
+    if design == "grid":
+        rows = [dict(zip(names, values)) for values in itertools.product(*(ranges[name] for name in names))]
+        return [{"point": i, "block": "grid", "params": {**fixed, **row}} for i, row in enumerate(rows)]
+
+    low = np.array([ranges[name][0] for name in names], dtype=float)
+    high = np.array([ranges[name][1] for name in names], dtype=float)
+    integer = [isinstance(ranges[name][0], int) and isinstance(ranges[name][1], int) for name in names]
+
+    def scale(unit):
+        values = low + unit * (high - low)
+        return [{name: int(round(v)) if is_int else float(v) for name, v, is_int in zip(names, row, integer)} for row in values]
+
+    seed = spec.get("master_seed")
+    if design == "lhs":
+        rows = scale(qmc.LatinHypercube(d=len(names), seed=seed).random(spec["samples"]))
+        return [{"point": i, "block": "lhs", "params": {**fixed, **row}} for i, row in enumerate(rows)]
+    if design == "sobol":
+        # Saltelli's scheme: matrices A and B, and for each parameter A with that column taken from B
+        base = qmc.Sobol(d=2 * len(names), seed=seed).random(spec["samples"])
+        a, b = base[:, :len(names)], base[:, len(names):]
+        blocks = [("A", a), ("B", b)]
+        for i, name in enumerate(names):
+            ab = a.copy()
+            ab[:, i] = b[:, i]
+            blocks.append(("AB_" + name, ab))
+        points = []
+        for block, unit in blocks:
+            for row in scale(unit): points.append({"point": len(points), "block": block, "params": {**fixed, **row}})
+        return points
+    raise ValueError(f"Unknown design: {design}")
+
+def spec_hash(spec):
+    """Hash of everything in a sweep spec but its master seed, with model classes given by name."""
+    described = {key: value for key, value in spec.items() if key != "master_seed"}
+    described["models"] = [m if isinstance(m, str) else m.__name__ for m in spec["models"]]
+    return hashlib.sha256(json.dumps(described, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def resume_spec(spec, output_csv_path):
+    """
+    The spec to run when writing to output_csv_path. The spec hash and master seed are saved next to the CSV, and a
+    sweep resumes only from a file written with the same spec and seed (ValueError otherwise). Without a master seed
+    one is drawn and saved, so a resumed sweep keeps the seeds of the rows it already has.
+    """
+    sidecar = output_csv_path + ".spec.json"
+    digest, master_seed = spec_hash(spec), spec.get("master_seed")
+    if os.path.exists(output_csv_path):
+        if not os.path.exists(sidecar):
+            raise ValueError(f"{output_csv_path} has no {sidecar}, so its rows cannot be matched to this spec; move it to start afresh")
+        with open(sidecar) as f: saved = json.load(f)
+        if saved["spec_hash"] != digest: raise ValueError(f"{output_csv_path} was written by a different sweep spec")
+        if master_seed is not None and master_seed != saved["master_seed"]:
+            raise ValueError(f"{output_csv_path} was written with master_seed={saved['master_seed']}, not {master_seed}")
+        return {**spec, "master_seed": saved["master_seed"]}
+    if master_seed is None: master_seed = int(np.random.SeedSequence().entropy)
+    with open(sidecar, "w") as f: json.dump({"spec_hash": digest, "master_seed": master_seed}, f)
+    return {**spec, "master_seed": master_seed}
+
+def expand(spec):
+    """Expands a sweep spec into jobs: one (model, params, seed) run per model, design point and replicate."""
+    model_classes = [getattr(models, m) if isinstance(m, str) else m for m in spec["models"]]
+    seeds = iteration_seeds(spec.get("master_seed"), spec.get("replicates", 1))
+    jobs = []
+    for model_class in model_classes:
+        run_class = engine_class(model_class, spec.get("engine", "agent"))
+        for point in design_points(spec):
+            for replicate, seed in enumerate(seeds):
+                jobs.append({
+                    "job": len(jobs), "model": model_class.__name__, "model_class": run_class,
+                    "point": point["point"], "block": point["block"], "params": point["params"],
+                    "replicate": replicate, "seed": seed,
+                    "max_steps": spec.get("max_steps", 365), "outputs": spec.get("outputs", DEFAULT_OUTPUTS),
+                })
+    return jobs
+
+####
+
+# --- Scheduler ---
+
+def run_job(job):
+    """Runs one job (or reads it from the sweep's cache) and returns its result row: the job's identifiers, its params and its outputs."""
+    df = run_iteration(job["model_class"], job["seed"], job["max_steps"], job["params"], cache=job.get("cache"))
+    row = {key: job[key] for key in ["job", "model", "point", "block", "replicate", "seed"]}
+    row.update(job["params"])
+    row.update(summarize(df, job["outputs"]))
+    return row
+
+def run_sweep(spec, workers=None, retries=2, output_csv_path=None, progress=None, cache=None):
+    """
+    Runs every job of a sweep spec on a work queue across `workers` processes (default: all cores) and returns one
+    row per job. A job that raises is queued again up to `retries` times; if a worker process dies the pool is
+    restarted and its unfinished jobs are queued again. Jobs that still fail are listed in the result's
+    attrs["failed"]; a job whose worker died is run again on its own first, and only a death there counts as a retry.
+    With output_csv_path, rows are appended as jobs finish, and jobs already in the file are skipped, so an
+    interrupted sweep resumes where it stopped (see resume_spec; the master seed used is in attrs["master_seed"]).
+    progress, if given, is called with (finished jobs, total jobs); by default every 10% is printed.
+    With a cache.ResultCache, runs shared with earlier sweeps or batches are read back instead of recomputed.
+    """
+    if output_csv_path: spec = resume_spec(spec, output_csv_path)
+    jobs = expand(spec)
+    for job in jobs: job["cache"] = cache
+    rows, done_ids = [], set()
+    if output_csv_path and os.path.exists(output_csv_path):
+        previous = pd.read_csv(output_csv_path)
+        rows, done_ids = previous.to_dict("records"), set(previous["job"])
+    pending = deque(job for job in jobs if job["job"] not in done_ids)
+    total, attempts, failed = len(jobs), {}, {}
+
+    if progress is None:
+        step = max(1, total // 10)
+        def progress(done, total):
+            if done % step == 0 or done == total: print(f"  ...completed {done}/{total} sweep jobs.")
+
+    writer_file = open(output_csv_path, "a", newline="") if output_csv_path else None
+    writer = None
+
+    def finish(row):
+        nonlocal writer
+        rows.append(row)
+        if writer_file:
+            if writer is None:
+                writer = csv.DictWriter(writer_file, fieldnames=list(row))
+                if writer_file.tell() == 0: writer.writeheader()
+            writer.writerow(row)
+            writer_file.flush()
+        progress(len(rows), total)
+
+    def retry(job, error):
+        attempts[job["job"]] = attempts.get(job["job"], 0) + 1
+        if attempts[job["job"]] <= retries: pending.append(job)
+        else: failed[job["job"]] = repr(error)
+
+    try:
+        workers = workers or os.cpu_count()
+        if workers == 1:
+            while pending:
+                job = pending.popleft()
+                try: finish(run_job(job))
+                except Exception as error: retry(job, error)
+        suspects = deque()  # jobs running when a worker died; any of them may have killed it
+        while pending or suspects:
+            # Suspects run one at a time, so a broken pool then points at the job that broke it
+            isolated = bool(suspects)
+            queue, width = (suspects, 1) if isolated else (pending, workers)
+            with ProcessPoolExecutor(max_workers=min(width, len(queue))) as pool:
+                running = {}
+                broken = False
+                while (queue or running) and not broken:
+                    while queue and len(running) < (1 if isolated else 2 * workers):
+                        job = queue.popleft()
+                        running[pool.submit(run_job, job)] = job
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        job = running.pop(future)
+                        try: finish(future.result())
+                        except BrokenProcessPool as error:
+                            broken = True
+                            if isolated: retry(job, error)
+                            else: suspects.append(job)
+                        except Exception as error: retry(job, error)
+                # A dead worker breaks the pool: what was still running is run again, without using up a retry
+                suspects.extend(running.values())
+    finally:
+        if writer_file: writer_file.close()
+
+    if failed: print(f"  {len(failed)} sweep jobs failed after {retries} retries: {sorted(failed)}")
+    result = pd.DataFrame(rows).sort_values("job").reset_index(drop=True) if rows else pd.DataFrame()
+    result.attrs["failed"] = failed
+    result.attrs["master_seed"] = spec.get("master_seed")
+    return result
+
+####
+
+# --- Sensitivity analysis ---
+
+def sensitivity(results, spec, output):
+    """
+    Sensitivity of `output` to each swept parameter, per model, from run_sweep results averaged over replicates.
+    For a "sobol" design, first-order (S1) and total (ST) Sobol indices with Saltelli's and Jansen's estimators;
+    for "grid" and "lhs" designs, standardized regression coefficients (SRC) and the fit's R^2.
+    """
+    names = list(spec["params"])
+    means = results.groupby(["model", "point", "block"], as_index=False)[names + [output]].mean()
+    frames = []
+    for model_name, df in means.groupby("model"):
+        if spec.get("design") == "sobol":
+            y = {block: group.sort_values("point")[output].to_numpy() for block, group in df.groupby("block")}
+            f_a, f_b = y["A"], y["B"]
+            variance = np.var(np.concatenate([f_a, f_b]), ddof=1)
+            rows = []
+            for name in names:
+                f_ab = y["AB_" + name]
+                rows.append({
+                    "Parameter": name,
+                    "S1": np.mean(f_b * (f_ab - f_a)) / variance if variance > 0 else np.nan,
+                    "ST": 0.5 * np.mean((f_a - f_ab) ** 2) / variance if variance > 0 else np.nan,
+                })
+        else:
+            x = df[names].to_numpy(dtype=float)
+            y = df[output].to_numpy(dtype=float)
+            x_std, y_std = x.std(axis=0), y.std()
+            z = np.divide(x - x.mean(axis=0), x_std, out=np.zeros_like(x), where=x_std > 0)
+            target = (y - y.mean()) / y_std if y_std > 0 else np.zeros_like(y)
+            coef, *_ = np.linalg.lstsq(z, target, rcond=None)
+            r2 = 1 - np.sum((target - z @ coef) ** 2) / np.sum(target ** 2) if y_std > 0 else np.nan
+            rows = [{"Parameter": name, "SRC": c, "R2": r2} for name, c in zip(names, coef)]
+        frame = pd.DataFrame(rows)
+        frame.insert(0, "Model", model_name)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True).set_index(["Model", "Parameter"])
@@ -0,0 +1,81 @@
+import numpy as np
+from agents import STATE_NAMES, STATE_CODES
+
+####
+
+# --- Integer state codes ---
+S, CP_S, CP_R, IP_S, IP_R = (STATE_CODES[name] for name in ["S", "Cp_s", "Cp_r", "Ip_s", "Ip_r"])
+
+####
+
+class TransmissionKernel:
+    """
+    Batched nurse-patient contact and transmission step shared by every model.
+    Probabilities are computed once per model, from the params it was built with, and are frozen from then
+    on: a change to model.params during a run reaches transmission only after
+    `model.kernel = TransmissionKernel(model.params, model.kernel.rng)`. Contacts and their random draws are
+    drawn for a whole ward at once, then resolved nurse by nurse so that a nurse contaminated
+    mid-round carries it to its later contacts and a patient colonised by one nurse can
+    contaminate the next, exactly as in the original per-contact loop.
+    """
+    def __init__(self, params, rng):
+        self.rng = rng
+        self.x = params["x"]
+        base_prob_pn = params["a"] * params["b_pn"] * (1 - params["theta"])
+        base_prob_np = params["a"] * params["b_np"] * (1 - params["theta"])
+
+        # Patient -> nurse contamination probability by patient state (before nurse compliance)
+        self.p_pn = np.zeros(len(STATE_NAMES))
+        self.p_pn[CP_S] = base_prob_pn * params["n"]
+        self.p_pn[IP_S] = base_prob_pn
+        self.p_pn[CP_R] = base_prob_pn * (1 - params["s_b"]) * params["n"]
+        self.p_pn[IP_R] = base_prob_pn * (1 - params["s_b"])
+
+        # Nurse -> susceptible patient colonisation probability by nurse state
+        self.p_np = {"Cn_s": base_prob_np, "Cn_r": base_prob_np * (1 - params["s_b"])}
+
+    def sample_contacts(self, num_nurses, num_patients, max_interactions):
+        """
+        Contact matrix (nurses x k) of distinct patient indices per nurse, in random order.
+        Floyd's algorithm runs over all nurse rows at once: column i draws from [0, n - k + i] and takes
+        n - k + i instead on a repeat, so each row is a uniform k-subset in O(k^2) work whatever the ward size;
+        the rows are then shuffled, as Floyd's order is not uniform.
+        """
+        k = min(max_interactions, num_patients)
+        if k <= 0: return np.empty((num_nurses, 0), dtype=np.intp)
+        draws = self.rng.integers(0, np.arange(num_patients - k + 1, num_patients + 1), size=(num_nurses, k))
+        contacts = np.empty((num_nurses, k), dtype=np.intp)
+        for i in range(k):
+            t = draws[:, i]
+            repeat = (contacts[:, :i] == t[:, None]).any(axis=1)
+            contacts[:, i] = np.where(repeat, num_patients - k + i, t)
+        return self.rng.permuted(contacts, axis=1)
+
+    def resolve(self, nurses, codes, contacts):
+        """
+        Runs each nurse's contacts in turn. codes holds the patients' integer states and is updated
+        in place; contacts gives, per nurse, the indices into codes it meets. Nurse states are updated
+        on the Nurse objects. Returns the indices of the patients colonised this round.
+        """
+        lengths = [len(rows) for rows in contacts]
+        u = self.rng.random((3, sum(lengths)))
+        colonised = []
+        start = 0
+        for nurse, rows, n in zip(nurses, contacts, lengths):
+            draws = u[:, start:start + n]
+            start += n
+            if n == 0: continue
+
+            if nurse.state == "U":
+                hits = np.flatnonzero(draws[0] < self.p_pn[codes[rows]] * nurse.compliance)
+                if not len(hits): continue
+                first = hits[0]
+                nurse.state = "Cn_s" if codes[rows[first]] in (CP_S, IP_S) else "Cn_r"
+                rows, draws = rows[first + 1:], draws[:, first + 1:]
+
+            hit = (codes[rows] == S) & (draws[1] < self.p_np[nurse.state])
+            new_rows = rows[hit]
+            cp, ip = (CP_S, IP_S) if nurse.state == "Cn_s" else (CP_R, IP_R)
+            codes[new_rows] = np.where(draws[2][hit] < self.x, ip, cp)
+            colonised.append(new_rows)
+        return np.concatenate(colonised) if colonised else np.empty(0, dtype=np.intp)